@@ -0,0 +1,19 @@
+import pytest
+from django.core.cache import cache
+
+from yatube.test_runner import temporary_caches
+
+
+@pytest.fixture(autouse=True, scope='session')
+def django_test_caches(django_test_environment):
+    """Keeps pytest away from the cache of the site, as the Django
+    test runner does."""
+    with temporary_caches():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(django_test_caches):
+    """Starts every test with an empty cache: the database is rolled
+    back after each test, and its cache effects never commit."""
+    cache.clear()
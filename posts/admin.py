@@ -1,15 +1,141 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import InvalidPage
 
+from . import search
 from .models import Comment, Follow, Group, Post
+from .paginators import CachedCountPaginator, KeysetPaginator
+
+CURSOR_VAR = 'cursor'
+
+
+class KeysetChangeList(ChangeList):
+    """Change list that pages by cursors over the sort keys, like the
+    feeds, whenever it is sorted by plain non-null columns, and by
+    page numbers with a bounded count otherwise."""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def _keyset_keys(self, request):
+        """Returns the ordering if rows can be sought by it."""
+        keys = self.get_ordering(request, self.queryset)
+        for key in keys:
+            if not isinstance(key, str):
+                return None
+            name = key.lstrip('-')
+            if name == 'pk':
+                continue
+            try:
+                field = self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if field.is_relation or not field.concrete or field.null:
+                return None
+        return keys
+
+    def get_results(self, request):
+        self.keyset_page = None
+        keys = self._keyset_keys(request)
+        if keys is None or self.show_all:
+            super().get_results(request)
+            return
+        paginator = KeysetPaginator(self.queryset, self.list_per_page,
+                                    keys=keys)
+        try:
+            page = paginator.page(request.GET.get(CURSOR_VAR))
+        except InvalidPage:
+            raise IncorrectLookupParameters
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = page.object_list
+        self.can_show_all = False
+        self.multi_page = page.has_other_pages()
+        self.paginator = paginator
+        self.keyset_page = page
+        self.next_url = self.previous_url = None
+        if page.next_cursor:
+            self.next_url = self.get_query_string(
+                {CURSOR_VAR: page.next_cursor})
+        if page.previous_cursor:
+            self.previous_url = self.get_query_string(
+                {CURSOR_VAR: page.previous_cursor})
+        elif page.has_previous():
+            self.previous_url = self.get_query_string(remove=[CURSOR_VAR])
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """Admin whose change list does not count or offset through the
+    whole table: it pages by cursors and stops counting past
+    PAGINATOR_COUNT_LIMIT."""
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+class UsernameFilter(admin.SimpleListFilter):
+    """Filters by a username typed into a box with suggestions instead
+    of listing every user in the sidebar."""
+    template = 'admin/posts/username_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(
+                **{f'{self.parameter_name}__username': self.value()})
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(
+                remove=[self.parameter_name, CURSOR_VAR]),
+            'display': 'Все',
+            'hidden': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, CURSOR_VAR)
+            ],
+        }
+
+
+class AuthorFilter(UsernameFilter):
+    title = 'автор'
+    parameter_name = 'author'
+
+
+class UserFilter(UsernameFilter):
+    title = 'пользователь'
+    parameter_name = 'user'
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ScalableModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', AuthorFilter)
+    raw_id_fields = ('author',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index instead of LIKE '%term%' over all texts.
+        if not search_term.strip():
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -20,15 +146,19 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableModelAdmin):
     list_display = ('pk', 'post', 'author', 'text')
-    search_fields = ('author',)
-    list_filter = ('author',)
+    list_select_related = ('post', 'author')
+    search_fields = ('=author__username',)
+    list_filter = (AuthorFilter,)
+    raw_id_fields = ('post', 'author')
     empty_value_display = '-пусто-'
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableModelAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user',)
-    list_filter = ('user',)
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username',)
+    list_filter = (UserFilter,)
+    raw_id_fields = ('user', 'author')
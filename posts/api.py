@@ -0,0 +1,259 @@
+"""JSON API of the feeds and the posts.
+
+Every reading endpoint pages by the same cursors as the HTML pages,
+takes ?fields= to return only some of the post fields and answers
+conditional requests: the public feeds compute their ETag from the
+generation page_cache keeps for the feed, without a query; the
+follow feed and the post from what they return.
+
+The batch endpoints create up to BATCH_MAX_ITEMS posts or comments
+per request for a user authenticated with HTTP Basic credentials, or
+by the session together with the CSRF token."""
+import base64
+import binascii
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.paginator import InvalidPage
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers, quote_etag)
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import batches, feeds, page_cache
+from .models import Group, Post
+from .paginators import KeysetPaginator
+from .views import COMMENT_KEYS
+
+User = get_user_model()
+
+
+def _image(post):
+    if not post.image:
+        return None
+    return {'url': post.image.url,
+            'width': post.image_width,
+            'height': post.image_height}
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date,
+    'updated': lambda post: post.updated,
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group and post.group.slug,
+    'image': _image,
+    'comment_count': lambda post: post.comment_count,
+    'url': lambda post: reverse('post', args=[post.author.username,
+                                              post.pk]),
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _fields(request):
+    """Returns the post fields named by ?fields=, all by default."""
+    names = [name.strip() for name in
+             request.GET.get('fields', '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in POST_FIELDS]
+    if unknown:
+        raise BadRequest(f'Неизвестные поля: {", ".join(unknown)}. '
+                         f'Доступны: {", ".join(POST_FIELDS)}.')
+    return names or list(POST_FIELDS)
+
+
+def _post(post, fields):
+    return {name: POST_FIELDS[name](post) for name in fields}
+
+
+def _comment(comment):
+    return {'id': comment.id,
+            'author': comment.author.username,
+            'text': comment.text,
+            'created': comment.created}
+
+
+def _error(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5(
+        '|'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def _respond(request, data, etag=None):
+    """Returns the data as JSON tagged with the ETag, by default one
+    hashed from the data itself, or 304 if the client has it."""
+    response = JsonResponse(data)
+    if etag is None:
+        etag = _etag(response.content)
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return get_conditional_response(request, etag=etag,
+                                    response=response) or response
+
+
+def api_view(view):
+    """Answers GET requests only and turns errors into JSON."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return _error(400, str(error))
+        except Http404 as error:
+            return _error(404, str(error) or 'Не найдено')
+    return wrapper
+
+
+def _page(request, paginator, fields):
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidPage:
+        raise Http404('Нет такой страницы')
+    return {
+        'results': [_post(post, fields) for post in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'has_previous': page.has_previous(),
+        'count': paginator.count if paginator.counted else None,
+        'approximate': paginator.approximate if paginator.counted else None,
+    }
+
+
+def _public_feed(request, feed, posts):
+    """Serves a page of a feed cached by page_cache, answering
+    revalidations from the generation of the feed alone."""
+    fields = _fields(request)
+    etag = _etag(feed, page_cache.generation(feed),
+                 request.GET.get('cursor', ''), ','.join(fields))
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
+    paginator = KeysetPaginator(posts(), settings.PAGINATE_BY,
+                                count_key=feeds.count_key(feed))
+    return _respond(request, _page(request, paginator, fields), etag)
+
+
+@api_view
+def index_feed(request):
+    return _public_feed(request, page_cache.index_feed(),
+                        Post.objects.for_feed)
+
+
+@api_view
+def group_feed(request, slug):
+    def posts():
+        group = get_object_or_404(Group, slug=slug)
+        return Post.objects.for_feed().filter(group=group)
+    return _public_feed(request, page_cache.group_feed(slug), posts)
+
+
+@api_view
+def author_feed(request, username):
+    def posts():
+        author = get_object_or_404(User, username=username)
+        return Post.objects.for_feed().filter(author=author)
+    return _public_feed(request, page_cache.author_feed(username), posts)
+
+
+@api_view
+def follow_feed(request):
+    if not request.user.is_authenticated:
+        return _error(401, 'Нужно войти')
+    fields = _fields(request)
+    paginator = feeds.follow_feed_paginator(request.user,
+                                            settings.PAGINATE_BY)
+    response = _respond(request, _page(request, paginator, fields))
+    patch_cache_control(response, private=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+@api_view
+def post_detail(request, username, post_id):
+    """Returns the post and a page of its comments, the newest first;
+    ?cursor= pages the comments."""
+    fields = _fields(request)
+    post = get_object_or_404(Post.objects.for_feed(),
+                             author__username=username, pk=post_id)
+    paginator = KeysetPaginator(post.comments.select_related('author'),
+                                settings.COMMENTS_PAGINATE_BY,
+                                keys=COMMENT_KEYS)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidPage:
+        raise Http404('Нет такой страницы комментариев')
+    return _respond(request, {
+        'post': _post(post, fields),
+        'comments': [_comment(comment) for comment in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'has_previous': page.has_previous(),
+    })
+
+
+def _batch_user(request):
+    """Returns the user the Basic credentials belong to or, without
+    them, the session user if the request passes the CSRF check."""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Basic '):
+        try:
+            username, password = base64.b64decode(
+                header[len('Basic '):]).decode().split(':', 1)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        return authenticate(request, username=username, password=password)
+    if request.user.is_authenticated and CsrfViewMiddleware().process_view(
+            request, None, (), {}) is None:
+        return request.user
+    return None
+
+
+def _batch(request, create):
+    user = _batch_user(request)
+    if user is None:
+        return _error(401, 'Нужно войти')
+    try:
+        items = json.loads(request.body.decode())['items']
+    except (UnicodeDecodeError, ValueError, TypeError, KeyError):
+        return _error(400, 'Ожидается JSON вида {"items": [...]}.')
+    if not isinstance(items, list):
+        return _error(400, 'Поле items должно быть списком.')
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        return _error(400, f'Не больше {settings.BATCH_MAX_ITEMS} '
+                           f'элементов за раз.')
+    results = create(user, items)
+    return JsonResponse({
+        'created': sum('id' in result for result in results),
+        'results': results,
+    })
+
+
+@csrf_exempt
+@require_POST
+def posts_batch(request):
+    """Creates the posts of the current user listed in the body,
+    {"items": [{"text": ..., "group": <id>}, ...]}."""
+    return _batch(request, batches.create_posts)
+
+
+@csrf_exempt
+@require_POST
+def comments_batch(request):
+    """Creates the comments of the current user listed in the body,
+    {"items": [{"post": <id>, "text": ...}, ...]}."""
+    return _batch(request, batches.create_comments)
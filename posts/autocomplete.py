@@ -0,0 +1,199 @@
+"""In-memory prefix index of the usernames and the groups, for
+suggesting the pages of authors and groups as a user types.
+
+The index is a sorted list of lowercased keys searched with bisect,
+loaded on the first lookup of the process. Signals update it in the
+process that made the change; other worker processes load it afresh
+once it is AUTOCOMPLETE_MAX_AGE seconds old."""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from .models import Group
+
+User = get_user_model()
+
+USER, GROUP = 'user', 'group'
+
+# Fields of a user the index depends on.
+USER_FIELDS = frozenset(('username', 'first_name', 'last_name', 'is_active'))
+
+WORD_START = re.compile(r'\b\w', re.UNICODE)
+
+
+def _user_target(pk, username, first_name, last_name):
+    full_name = f'{first_name} {last_name}'.strip()
+    keys = {username.casefold()}
+    keys.update(_word_keys(full_name))
+    return (USER, pk), username, full_name or username, keys
+
+
+def _group_target(pk, slug, title):
+    keys = {slug.casefold()}
+    keys.update(_word_keys(title))
+    return (GROUP, pk), slug, title, keys
+
+
+def _word_keys(text):
+    """Returns the text from the start of each of its words, so that
+    any word of a name or a title can be typed first."""
+    text = text.casefold()
+    return {text[match.start():] for match in WORD_START.finditer(text)}
+
+
+class PrefixIndex:
+    """Sorted keys with the (kind, pk) target of each alongside, and
+    the value, the label and the keys of every target.
+
+    A stale index is reloaded outside the lock while lookups keep
+    using the old one; the changes made meanwhile are replayed on
+    the new one before it replaces the old."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = None
+        self._reloading = None
+        self._keys = []
+        self._targets = []
+        self._details = {}
+
+    @staticmethod
+    def _build():
+        details = {}
+        for row in User.objects.filter(is_active=True).values_list(
+                'pk', 'username', 'first_name', 'last_name').iterator():
+            target, *rest = _user_target(*row)
+            details[target] = rest
+        for row in Group.objects.values_list(
+                'pk', 'slug', 'title').iterator():
+            target, *rest = _group_target(*row)
+            details[target] = rest
+        entries = sorted((key, target)
+                         for target, (_, _, keys) in details.items()
+                         for key in keys)
+        return ([key for key, _ in entries],
+                [target for _, target in entries], details)
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded is None:
+                # Nothing to serve yet: lookups wait for the first load.
+                self._keys, self._targets, self._details = self._build()
+                self._loaded = time.monotonic()
+                return
+            if (self._reloading is not None
+                    or time.monotonic() - self._loaded
+                    <= settings.AUTOCOMPLETE_MAX_AGE):
+                return
+            self._reloading = []
+        try:
+            built = self._build()
+        except BaseException:
+            with self._lock:
+                self._reloading = None
+            raise
+        with self._lock:
+            replay, self._reloading = self._reloading, None
+            if replay is None or self._loaded is None:
+                return  # Cleared meanwhile.
+            self._keys, self._targets, self._details = built
+            self._loaded = time.monotonic()
+            for change in replay:
+                change()
+
+    def _insert(self, target, value, label, keys):
+        self._details[target] = (value, label, keys)
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            self._keys.insert(position, key)
+            self._targets.insert(position, target)
+
+    def _remove(self, target):
+        value, label, keys = self._details.pop(target, (None, None, ()))
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            while (position < len(self._keys)
+                   and self._keys[position] == key):
+                if self._targets[position] == target:
+                    del self._keys[position], self._targets[position]
+                    break
+                position += 1
+
+    def _change(self, change):
+        """Applies a change to a loaded index, and again to the one
+        being reloaded, which may have been read before it."""
+        with self._lock:
+            if self._loaded is None:
+                return
+            change()
+            if self._reloading is not None:
+                self._reloading.append(change)
+
+    def _replace(self, target, entry=None):
+        def change():
+            self._remove(target)
+            if entry is not None:
+                self._insert(*entry)
+        self._change(change)
+
+    def update_user(self, user):
+        self._replace((USER, user.pk), _user_target(
+            user.pk, user.username, user.first_name,
+            user.last_name) if user.is_active else None)
+
+    def update_group(self, group):
+        self._replace((GROUP, group.pk),
+                      _group_target(group.pk, group.slug, group.title))
+
+    def remove(self, kind, pk):
+        self._replace((kind, pk))
+
+    def clear(self):
+        """Drops the index; the next lookup loads it again."""
+        with self._lock:
+            self._loaded = None
+            self._reloading = None
+            self._keys, self._targets, self._details = [], [], {}
+
+    def lookup(self, prefix, limit=None):
+        """Returns up to `limit` authors and groups having a name,
+        a title or a word of them starting with the prefix, as
+        (kind, value, label) in the order of the matched keys."""
+        prefix = prefix.strip().casefold()
+        limit = limit or settings.AUTOCOMPLETE_LIMIT
+        if not prefix:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            found, seen = [], set()
+            position = bisect_left(self._keys, prefix)
+            while (len(found) < limit and position < len(self._keys)
+                   and self._keys[position].startswith(prefix)):
+                target = self._targets[position]
+                position += 1
+                if target in seen:
+                    continue
+                seen.add(target)
+                value, label, _ = self._details[target]
+                found.append((target[0], value, label))
+            return found
+
+
+index = PrefixIndex()
+
+
+def suggest(prefix, limit=None):
+    """Returns the matches of the prefix ready to be sent as JSON."""
+    return [
+        {'type': kind,
+         'value': value,
+         'label': label,
+         'url': reverse('profile' if kind == USER else 'group',
+                        args=[value])}
+        for kind, value, label in index.lookup(prefix, limit)
+    ]
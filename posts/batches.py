@@ -0,0 +1,146 @@
+"""Creation of many posts or comments at once.
+
+The valid items of a batch are inserted with bulk_create in one
+transaction. bulk_create sends no signals, so the side effects the
+receivers in posts.signals apply item by item are applied here once
+for the whole batch: the database ones inside the transaction, the
+cache ones once it commits, so that no reader caches the state from
+before the batch again."""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+
+from . import counters, feeds, page_cache, tasks, timelines
+from .forms import CommentForm, PostForm
+from .models import Comment, Post, Profile
+
+NOT_AN_OBJECT = {'__all__': [
+    {'message': 'Ожидается объект с полями.', 'code': 'invalid'}]}
+
+
+def _recover_pks(model, objects):
+    """Sets the primary keys bulk_create leaves unset on backends that
+    cannot return them, such as SQLite. The transaction holds the
+    write lock since the insert, so the newest rows are the inserted
+    ones, in order."""
+    if not objects or objects[0].pk is not None:
+        return
+    pks = model.objects.order_by('-pk').values_list(
+        'pk', flat=True)[:len(objects)]
+    for obj, pk in zip(objects, reversed(list(pks))):
+        obj.pk = pk
+        obj._state.adding = False
+
+
+def _validate(items, make_form, build):
+    """Returns the result of every item, with the errors of the
+    invalid ones, and the unsaved objects built from the valid
+    ones with the indexes of their results."""
+    results, objects = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({'index': index, 'errors': NOT_AN_OBJECT})
+            continue
+        form = make_form(item)
+        obj = build(form) if form.is_valid() else None
+        if obj is None:
+            results.append({'index': index,
+                            'errors': form.errors.get_json_data()})
+            continue
+        results.append({'index': index})
+        objects.append((len(results) - 1, obj))
+    return results, objects
+
+
+def _feeds_of(posts):
+    """Returns the feeds showing the posts, by page_cache name."""
+    names = {page_cache.index_feed()}
+    for post in posts:
+        names.add(page_cache.author_feed(post.author.username))
+        if post.group_id:
+            names.add(page_cache.group_feed(post.group.slug))
+    return names
+
+
+def create_posts(author, items):
+    """Creates the author's posts from the items that PostForm
+    accepts; images cannot be sent in a batch."""
+    def build(form):
+        post = form.save(commit=False)
+        post.author = author
+        return post
+
+    results, built = _validate(items, PostForm, build)
+    posts = [post for _, post in built]
+    with transaction.atomic():
+        Post.objects.bulk_create(posts)
+        _recover_pks(Post, posts)
+        if posts:
+            _posts_created(author, posts)
+            transaction.on_commit(lambda: _posts_committed(author, posts))
+    for result, post in built:
+        results[result].update(id=post.pk, url=reverse(
+            'post', args=[author.username, post.pk]))
+    return results
+
+
+def _posts_created(author, posts):
+    counters.change_posts(author.pk, len(posts))
+    followers = Profile.objects.filter(user=author).values_list(
+        'followers_count', flat=True).first()
+    if followers and followers > settings.TIMELINE_INLINE_FAN_OUT:
+        tasks.fan_out_posts.enqueue([post.pk for post in posts])
+    else:
+        timelines.fan_out_posts(author, posts)
+
+
+def _posts_committed(author, posts):
+    feeds.forget_author_posts(author.pk)
+    feeds.change_counts(len(posts), page_cache.index_feed(),
+                        page_cache.author_feed(author.username))
+    groups = Counter(post.group.slug for post in posts if post.group_id)
+    for slug, count in groups.items():
+        feeds.change_counts(count, page_cache.group_feed(slug))
+    page_cache.bump_post_feeds(author.username, *groups)
+
+
+def create_comments(author, items):
+    """Creates the author's comments from the items that CommentForm
+    accepts, each naming the id of its post."""
+    def post_id(item):
+        pk = item.get('post')
+        return pk if isinstance(pk, int) else None
+
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        {post_id(item) for item in items if isinstance(item, dict)} - {None})
+
+    def build(form):
+        post = posts.get(post_id(form.data))
+        if post is None:
+            form.add_error(None, 'Нет такой записи.')
+            return None
+        comment = form.save(commit=False)
+        comment.post = post
+        comment.author = author
+        return comment
+
+    results, built = _validate(items, CommentForm, build)
+    comments = [comment for _, comment in built]
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        _recover_pks(Comment, comments)
+        if comments:
+            _comments_created(comments)
+            transaction.on_commit(lambda: page_cache.bump(
+                *_feeds_of(comment.post for comment in comments)))
+    for result, comment in built:
+        results[result].update(id=comment.pk, post=comment.post_id)
+    return results
+
+
+def _comments_created(comments):
+    for post_id, count in Counter(
+            comment.post_id for comment in comments).items():
+        counters.change_comments(post_id, count)
@@ -0,0 +1,56 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+
+CARD_KEY = 'post_card:{pk}:{version}:{viewer}'
+VIEWERS = ('author', 'reader')
+
+
+def _version(post):
+    """Everything a card shows that can change after publishing,
+    including the author's username and the group's slug and title,
+    so renaming them retires the cards showing the old ones."""
+    group = post.group if post.group_id else None
+    shown = [post.updated.timestamp(), post.comment_count,
+             post.author.username,
+             group and group.slug, group and group.title]
+    return hashlib.md5(repr(shown).encode()).hexdigest()
+
+
+def _card_key(post, viewer):
+    return CARD_KEY.format(pk=post.pk, version=_version(post), viewer=viewer)
+
+
+def attach_cards(posts, user):
+    """Sets `card` of every post to its rendered post_item.html,
+    reading all cached cards with one request to the cache
+    and rendering only the missing ones, whose images are
+    resolved in one batch too.
+
+    The author sees an edit link on their posts, so authors
+    and readers get different cards."""
+    keys = {}
+    for post in posts:
+        viewer = 'author' if post.author_id == user.pk else 'reader'
+        keys[_card_key(post, viewer)] = post
+    cards = cache.get_many(keys)
+    thumbnails.attach_pictures(
+        post for key, post in keys.items() if key not in cards)
+    missing = {}
+    for key, post in keys.items():
+        if key not in cards:
+            cards[key] = missing[key] = render_to_string(
+                'include/post_item.html', {'post': post, 'user': user})
+        post.card = mark_safe(cards[key])
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_TIMEOUT)
+
+
+def forget_cards(post):
+    """Drops the cached cards of the current version of the post."""
+    cache.delete_many([_card_key(post, viewer) for viewer in VIEWERS])
@@ -0,0 +1,56 @@
+from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, Profile
+
+
+def _change(queryset, field, delta):
+    """Atomically adds delta to the counter, never taking it
+    below zero if it has drifted."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_posts(author_id, delta):
+    _change(Profile.objects.filter(user=author_id), 'posts_count', delta)
+
+
+def change_comments(post_id, delta):
+    _change(Post.objects.filter(pk=post_id), 'comment_count', delta)
+
+
+def change_follows(user_id, author_id, delta):
+    _change(Profile.objects.filter(user=author_id),
+            'followers_count', delta)
+    _change(Profile.objects.filter(user=user_id),
+            'following_count', delta)
+
+
+def _count(queryset, field, outer='pk'):
+    """Returns a subquery counting the rows of the queryset
+    whose field points to the outer row."""
+    counted = queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+        field).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counted, output_field=models.IntegerField()), 0)
+
+
+def recount_comments(posts):
+    """Recomputes the comment counters of the posts."""
+    return posts.update(comment_count=_count(Comment.objects, 'post'))
+
+
+def recount_profiles(users):
+    """Creates the missing profiles of the users
+    and recomputes their counters."""
+    Profile.objects.bulk_create(
+        (Profile(user_id=pk) for pk in users.filter(
+            profile__isnull=True).values_list('pk', flat=True)),
+        ignore_conflicts=True,
+    )
+    return Profile.objects.filter(user__in=users).update(
+        posts_count=_count(Post.objects, 'author', 'user'),
+        followers_count=_count(Follow.objects, 'author', 'user'),
+        following_count=_count(Follow.objects, 'user', 'user'),
+    )
@@ -0,0 +1,141 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from . import timelines
+from .models import Follow, Post
+from .paginators import KeysetPaginator
+
+AUTHOR_POSTS_KEY = 'feeds:author_posts:{}'
+COUNT_KEY = 'feeds:count:{}'
+
+
+def count_key(feed):
+    """Returns the cache key of the number of posts in the feed
+    named by one of the page_cache feed functions."""
+    return COUNT_KEY.format(feed)
+
+
+def change_counts(delta, *feeds):
+    """Adjusts the cached numbers of posts in the feeds; a count
+    that is not cached is recounted on the next read.
+
+    A count past PAGINATOR_COUNT_LIMIT may be only the bound the
+    paginator stopped counting at, so it is dropped rather than made
+    smaller, which would pass it off as exact."""
+    limit = settings.PAGINATOR_COUNT_LIMIT
+    for feed in feeds:
+        key = count_key(feed)
+        if delta < 0 and (cache.get(key) or 0) > limit:
+            cache.delete(key)
+            continue
+        try:
+            count = cache.incr(key, delta)
+        except ValueError:
+            continue
+        if delta < 0 and count - delta > limit:
+            cache.delete(key)
+
+
+def _author_posts_key(author_id):
+    return AUTHOR_POSTS_KEY.format(author_id)
+
+
+def _load_recent_posts(author_id):
+    return list(Post.objects.filter(author=author_id).order_by(
+        '-pub_date', '-id').values_list('pub_date', 'id')[
+        :settings.FOLLOW_FEED_CACHED_POSTS])
+
+
+def recent_posts(author_ids):
+    """Returns the cached (pub_date, id) lists of the newest posts
+    of every author, loading the missing ones from the database."""
+    keys = {author_id: _author_posts_key(author_id)
+            for author_id in author_ids}
+    cached = cache.get_many(keys.values())
+    result, missing = {}, {}
+    for author_id, key in keys.items():
+        if key in cached:
+            result[author_id] = cached[key]
+        else:
+            result[author_id] = missing[key] = _load_recent_posts(author_id)
+    if missing:
+        cache.set_many(missing, settings.FOLLOW_FEED_CACHED_POSTS_TIMEOUT)
+    return result
+
+
+def forget_author_posts(author_id):
+    """Drops the cached list of the author's posts, which is loaded
+    again on the next read; editing it in place could lose a post
+    to a concurrent edit."""
+    cache.delete(_author_posts_key(author_id))
+
+
+class MergeFeedPaginator(KeysetPaginator):
+    """Builds the follow feed by a k-way merge of the cached lists
+    of recent posts of every followed author.
+
+    Only an author whose cached list runs out before the page is
+    full is read from the database."""
+
+    def __init__(self, user, per_page, **kwargs):
+        self.user = user
+        super().__init__(Post.objects.for_feed(), per_page, **kwargs)
+
+    def _fetch(self, values, backwards, limit):
+        author_ids = Follow.objects.filter(
+            user=self.user).values_list('author', flat=True)
+        cursor = tuple(values) if values is not None else None
+        streams = [
+            self._author_stream(author_id, recent, cursor, backwards, limit)
+            for author_id, recent in recent_posts(author_ids).items()
+        ]
+        keys = list(islice(
+            heapq.merge(*streams, reverse=not backwards), limit))
+        posts = self.object_list.in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+    def _author_stream(self, author_id, recent, cursor, backwards, limit):
+        """Returns up to `limit` keys of the author's posts past the
+        cursor, in the direction of travel."""
+        complete = len(recent) < settings.FOLLOW_FEED_CACHED_POSTS
+        if not backwards:
+            keys = [key for key in recent if cursor is None or key < cursor]
+            if complete or len(keys) >= limit:
+                return keys[:limit]
+        else:
+            keys = [key for key in reversed(recent) if key > cursor]
+            if complete or recent and recent[-1] <= cursor:
+                return keys[:limit]
+        queryset = Post.objects.filter(author=author_id).order_by(*self.keys)
+        if backwards:
+            queryset = queryset.reverse()
+        if cursor is not None:
+            queryset = queryset.filter(self._seek(cursor, backwards))
+        return list(queryset.values_list('pub_date', 'id')[:limit])
+
+
+def follow_feed_paginator(user, per_page):
+    """Returns the paginator of the user's follow feed built by the
+    engine chosen in settings.FOLLOW_FEED_ENGINE.
+
+    The feed of every user changes with every post of the followed
+    authors, so its total is not counted."""
+    engine = settings.FOLLOW_FEED_ENGINE
+    if engine == 'timeline':
+        return KeysetPaginator(timelines.timeline_posts(user), per_page,
+                               keys=timelines.TIMELINE_KEYS, counted=False)
+    if engine == 'merge':
+        return MergeFeedPaginator(user, per_page, counted=False)
+    if engine == 'query':
+        following_users = Follow.objects.filter(
+            user=user).values_list('author', flat=True)
+        return KeysetPaginator(
+            Post.objects.for_feed().filter(author__in=following_users),
+            per_page, counted=False)
+    raise ImproperlyConfigured(
+        f'Unknown FOLLOW_FEED_ENGINE {engine!r}; '
+        f'use "timeline", "merge" or "query".')
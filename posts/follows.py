@@ -0,0 +1,26 @@
+from django.db import IntegrityError, transaction
+
+from .models import Follow
+
+
+def follow(user, author):
+    """Subscribes the user to the author with a single INSERT.
+
+    The unique and check constraints of Follow reject repeated
+    and self subscriptions; returns whether a subscription was made.
+    The receivers in posts.signals keep the counters, the timeline
+    and the cached profile pages in step."""
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, author):
+    """Unsubscribes the user from the author; returns whether there
+    was a subscription."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return bool(deleted)
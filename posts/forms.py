@@ -1,5 +1,6 @@
 from django import forms
 
+from posts import images
 from posts.models import Comment, Post
 
 
@@ -13,6 +14,18 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def clean_image(self):
+        """Normalizes a new upload before it is stored
+        and keeps its size."""
+        image = self.cleaned_data['image']
+        if 'image' in self.changed_data:
+            width, height = None, None
+            if hasattr(image, 'image'):
+                image, (width, height) = images.normalize(image)
+            self.instance.image_width = width
+            self.instance.image_height = height
+        return image
+
 
 class CommentForm(forms.ModelForm):
     """Comments class for creating a new comment."""
@@ -0,0 +1,68 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Formats stored as they came; anything else is stored as JPEG.
+KEPT_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+
+def _encode(image, image_format, icc_profile):
+    options = {}
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    if image_format in ('JPEG', 'WEBP'):
+        options['quality'] = settings.POST_IMAGE_QUALITY
+    if image_format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+    elif image_format == 'PNG':
+        options['optimize'] = True
+    data = BytesIO()
+    image.save(data, image_format, **options)
+    return data.getvalue()
+
+
+def normalize(upload):
+    """Returns the upload ready to be stored and its size.
+
+    The size is read from the header before anything is decoded, so
+    that decompression bombs are rejected for free. The rest is
+    re-encoded at POST_IMAGE_QUALITY without EXIF and other metadata,
+    upright and no larger than POST_IMAGE_MAX_SIDE; animations are
+    only checked."""
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError('Изображение слишком большое.')
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение слишком большое: не больше %(limit)s '
+            'мегапикселей.',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6})
+    if getattr(image, 'n_frames', 1) > 1:
+        upload.seek(0)
+        return upload, (width, height)
+
+    image_format = image.format
+    icc_profile = image.info.get('icc_profile')
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    # Lets the JPEG decoder skip detail that downscaling would drop.
+    image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    name = upload.name
+    if image_format not in KEPT_FORMATS:
+        image_format = 'JPEG'
+        name = f'{os.path.splitext(name)[0]}.jpg'
+    normalized = SimpleUploadedFile(
+        name, _encode(image, image_format, icc_profile),
+        content_type=Image.MIME[image_format])
+    return normalized, image.size
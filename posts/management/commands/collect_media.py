@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = ('Removes post images and thumbnails nothing refers to, '
+            'in throttled batches that resume where the last run '
+            'stopped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='List what would be removed without removing it.')
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.MEDIA_GC_BATCH_SIZE,
+            help='Number of files or entries examined per batch.')
+        parser.add_argument(
+            '--rate', type=float, default=settings.MEDIA_GC_RATE,
+            help='Files or entries examined per second at most, '
+                 '0 for no limit.')
+        parser.add_argument(
+            '--limit', type=int, default=0,
+            help='Stop after examining about this many files or '
+                 'entries, 0 to go through everything.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Start over instead of resuming the last run.')
+
+    def handle(self, *args, **options):
+        dry_run, rate = options['dry_run'], options['rate']
+        phases = list(media.PHASES)
+        progress = None if options['restart'] else cache.get(
+            media.PROGRESS_KEY)
+        phase, after = progress or (phases[0], None)
+        examined = removed = 0
+        while phase is not None:
+            started = time.monotonic()
+            count, names, after = media.collect(
+                phase, after, options['batch_size'], dry_run)
+            examined += count
+            removed += len(names)
+            if dry_run or options['verbosity'] > 1:
+                for name in names:
+                    self.stdout.write(name)
+            if after is None:
+                index = phases.index(phase) + 1
+                phase = phases[index] if index < len(phases) else None
+            if not dry_run:
+                if phase is None:
+                    cache.delete(media.PROGRESS_KEY)
+                else:
+                    cache.set(media.PROGRESS_KEY, (phase, after), None)
+            if phase is None or options['limit'] and (
+                    examined >= options['limit']):
+                break
+            if rate:
+                time.sleep(max(0, count / rate
+                               - (time.monotonic() - started)))
+        verb = 'Would remove' if dry_run else 'Removed'
+        state = 'done' if phase is None else f'stopped in {phase}'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} of {examined} examined, {state}.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import tasks
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Queues the thumbnails of post images uploaded before '
+            'they were made in the background.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Queue every post image, not only the ones without '
+                 'a stored size.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            posts = posts.filter(image_width=None)
+        queued = 0
+        with transaction.atomic():
+            for post_id in posts.values_list('pk', flat=True).iterator():
+                tasks.make_thumbnails.enqueue(post_id)
+                queued += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Queued thumbnails of {queued} posts.'))
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts import counters
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the stored post, comment and subscription '
+            'counters in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows updated per statement.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = self._recount(Post.objects, counters.recount_comments,
+                              batch_size)
+        profiles = self._recount(User.objects, counters.recount_profiles,
+                                 batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted {posts} posts and {profiles} profiles.'))
+
+    def _recount(self, queryset, recount, batch_size):
+        """Applies recount to consecutive primary key ranges
+        so that every statement touches a bounded number of rows."""
+        last_pk = queryset.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+        updated = 0
+        for start in range(0, last_pk, batch_size):
+            updated += recount(queryset.filter(
+                pk__gt=start, pk__lte=start + batch_size))
+        return updated
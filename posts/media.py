@@ -0,0 +1,264 @@
+"""Reference counts of the stored post images and the collection of
+the files and thumbnails nothing refers to any more."""
+import os
+import posixpath
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import MediaFile, Post
+
+# Cache key of the phase and the marker the collection continues from.
+PROGRESS_KEY = 'media:collect'
+
+
+def acquire(name):
+    """Counts one more post using the stored file."""
+    if not name:
+        return
+    media_file, created = MediaFile.objects.get_or_create(
+        name=name, defaults={'references': 1})
+    if not created:
+        MediaFile.objects.filter(pk=media_file.pk).update(
+            references=F('references') + 1)
+
+
+def release(name):
+    """Counts one post less using the stored file; a file nobody
+    uses any more stays on disk until it is collected."""
+    if name:
+        MediaFile.objects.filter(name=name, references__gt=0).update(
+            references=F('references') - 1)
+
+
+def _image_field():
+    return Post._meta.get_field('image')
+
+
+def _walk(storage, root, after=None):
+    """Yields the names of the files under the root directory of the
+    storage in sorted order, starting after the name `after`, with the
+    time each was last modified."""
+    after = tuple(after.split('/')) if after else ()
+
+    def walk(parts):
+        try:
+            entries = sorted(os.scandir(storage.path(posixpath.join(*parts))),
+                             key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            path = parts + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                if path >= after[:len(path)]:
+                    yield from walk(path)
+            elif path > after:
+                yield '/'.join(path), entry.stat().st_mtime
+
+    yield from walk(tuple(root.strip('/').split('/')))
+
+
+def _settled(walked, batch_size):
+    """Takes a batch of walked files, leaving out the ones written
+    within MEDIA_GC_GRACE seconds: their posts may not be saved yet."""
+    batch = []
+    for name, modified in walked:
+        batch.append((name, modified < time.time() - settings.MEDIA_GC_GRACE))
+        if len(batch) == batch_size:
+            break
+    return batch
+
+
+def _prune(storage, name, root):
+    """Removes the directories of the deleted file left empty,
+    up to the root directory."""
+    directory = posixpath.dirname(name)
+    while directory and directory != root.strip('/'):
+        try:
+            os.rmdir(storage.path(directory))
+        except OSError:
+            return
+        directory = posixpath.dirname(directory)
+
+
+def _drop_thumbnails(key):
+    """Deletes the thumbnails made from the source with the key and
+    all their entries in sorl-thumbnail's key-value store."""
+    kvstore = default.kvstore
+    for thumbnail_key in kvstore._get(key, identity='thumbnails') or []:
+        thumbnail = kvstore._get(thumbnail_key)
+        if thumbnail:
+            kvstore.delete(thumbnail, delete_thumbnails=False)
+            thumbnail.delete()
+    kvstore._delete(key, identity='thumbnails')
+    kvstore._delete(key)
+
+
+def _settled_file(storage, name):
+    try:
+        modified = os.path.getmtime(storage.path(name))
+    except FileNotFoundError:
+        return True
+    return modified < time.time() - settings.MEDIA_GC_GRACE
+
+
+def _set_aside(storage, name):
+    """Renames the stored file to a name no upload is stored as,
+    so that an identical upload from then on writes the file anew;
+    returns the new name, or None when an upload touched the file
+    before the rename and it has been put back."""
+    aside = posixpath.join(posixpath.dirname(name),
+                           f'.{uuid.uuid4().hex}.removed')
+    try:
+        os.rename(storage.path(name), storage.path(aside))
+    except FileNotFoundError:
+        return aside
+    if _settled_file(storage, aside):
+        return aside
+    # The content is the same, so it may replace the file an upload
+    # has written since the rename.
+    os.replace(storage.path(aside), storage.path(name))
+    return None
+
+
+def _remove_unused(name):
+    """Removes the stored image and its count unless a post has taken
+    it again since it was found unused; returns whether it did.
+
+    SQLite ignores select_for_update(), but its transactions are
+    serializable: when a post takes the count after it was read, the
+    deletion of the count fails with "database is locked" before the
+    file is touched. The storage touches the file it stores an
+    identical upload as before the post is saved, so the file is
+    renamed aside and put back if it was touched: an upload either
+    touched it before the rename or writes it anew after it."""
+    storage = _image_field().storage
+    with transaction.atomic():
+        counted = MediaFile.objects.select_for_update().filter(
+            name=name).first()
+        if (counted is not None and counted.references
+                or Post.objects.filter(image=name).exists()
+                or not _settled_file(storage, name)):
+            return False
+        if counted is not None:
+            counted.delete()
+        aside = _set_aside(storage, name)
+        if aside is None:
+            transaction.set_rollback(True)
+            return False
+        _drop_thumbnails(ImageFile(name, storage).key)
+        storage.delete(aside)
+        _prune(storage, name, _image_field().upload_to)
+    return True
+
+
+def _used(names):
+    """Returns the names among the given ones some post refers to."""
+    used = set(Post.objects.filter(image__in=names).values_list(
+        'image', flat=True))
+    used.update(MediaFile.objects.filter(
+        name__in=names, references__gt=0).values_list('name', flat=True))
+    return used
+
+
+def _collect_released(after, batch_size, dry_run):
+    """Removes the files whose reference count has dropped to zero."""
+    rows = list(MediaFile.objects.filter(
+        references=0, pk__gt=after or 0).order_by('pk').values_list(
+        'pk', 'name')[:batch_size])
+    storage = _image_field().storage
+    used = set(Post.objects.filter(
+        image__in=[name for _, name in rows]).values_list('image', flat=True))
+    removed = []
+    for pk, name in rows:
+        if name in used or not _settled_file(storage, name):
+            continue
+        if dry_run or _remove_unused(name):
+            removed.append(name)
+    marker = rows[-1][0] if len(rows) == batch_size else None
+    return len(rows), removed, marker
+
+
+def _collect_originals(after, batch_size, dry_run):
+    """Removes the stored images no post and no count refers to,
+    such as the files of posts deleted before they were counted."""
+    root = _image_field().upload_to
+    batch = _settled(_walk(_image_field().storage, root, after), batch_size)
+    used = _used([name for name, _ in batch])
+    removed = [name for name, settled in batch
+               if settled and name not in used]
+    if not dry_run:
+        removed = [name for name in removed if _remove_unused(name)]
+    marker = batch[-1][0] if len(batch) == batch_size else None
+    return len(batch), removed, marker
+
+
+def _collect_sources(after, batch_size, dry_run):
+    """Drops the thumbnails of post images that are no longer used or
+    were registered under another storage, keeping the images."""
+    kvstore, storage = default.kvstore, _image_field().storage
+    prefix = add_prefix('', 'thumbnails')
+    keys = list(KVStore.objects.filter(
+        key__startswith=prefix, key__gt=after or prefix).order_by(
+        'key').values_list('key', flat=True)[:batch_size])
+    sources = {key: kvstore._get(del_prefix(key)) for key in keys}
+    used = set(Post.objects.filter(image__in=[
+        source.name for source in sources.values() if source
+    ]).values_list('image', flat=True))
+    removed = []
+    for key, source in sources.items():
+        if source is not None:
+            if not source.name.startswith(_image_field().upload_to):
+                continue
+            if (source.name in used and del_prefix(key)
+                    == ImageFile(source.name, storage).key):
+                continue
+        if not dry_run:
+            _drop_thumbnails(del_prefix(key))
+        removed.append(source.name if source else key)
+    marker = keys[-1] if len(keys) == batch_size else None
+    return len(keys), removed, marker
+
+
+def _collect_thumbnails(after, batch_size, dry_run):
+    """Removes the thumbnail files sorl-thumbnail has no entry for."""
+    root, storage = sorl_settings.THUMBNAIL_PREFIX, default.storage
+    batch = _settled(_walk(storage, root, after), batch_size)
+    keys = {add_prefix(ImageFile(name, storage).key): name
+            for name, _ in batch}
+    known = set(KVStore.objects.filter(key__in=keys).values_list(
+        'key', flat=True))
+    known = {keys[key] for key in known}
+    removed = [name for name, settled in batch
+               if settled and name not in known]
+    if not dry_run:
+        for name in removed:
+            storage.delete(name)
+            _prune(storage, name, root)
+    marker = batch[-1][0] if len(batch) == batch_size else None
+    return len(batch), removed, marker
+
+
+PHASES = {
+    'released': _collect_released,
+    'originals': _collect_originals,
+    'sources': _collect_sources,
+    'thumbnails': _collect_thumbnails,
+}
+
+
+def collect(phase, after=None, batch_size=200, dry_run=False):
+    """Examines one batch of the phase past the marker `after`.
+
+    Returns the number of entries examined, the names of the removed
+    ones and the marker to continue from, None once the phase is
+    through; with `dry_run` nothing is removed."""
+    return PHASES[phase](after, batch_size, dry_run)
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.6 on 2026-10-18 03:16
+
+from django.db import migrations, models
+import django.db.models.expressions
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Profile = apps.get_model('posts', 'Profile')
+    Follow.objects.filter(user=models.F('author')).delete()
+    kept = Follow.objects.values('user', 'author').annotate(
+        kept_id=Min('id')).values('kept_id')
+    Follow.objects.exclude(id__in=kept).delete()
+
+    def count(field):
+        counted = Follow.objects.filter(
+            **{field: OuterRef('user')}).order_by().values(field).annotate(
+            count=Count('pk')).values('count')
+        return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+    Profile.objects.update(followers_count=count('author'),
+                           following_count=count('user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follow_user_author_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='no_self_follow'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:02
+
+from django.conf import settings
+from django.db import migrations
+
+# The indexed columns of a post, for the post row `row`.
+POST_COLUMNS = """
+    {row}.id, {row}.text,
+    (SELECT username FROM auth_user WHERE id = {row}.author_id),
+    COALESCE((SELECT title FROM posts_group WHERE id = {row}.group_id), '')
+"""
+
+CREATE = [
+    "CREATE VIRTUAL TABLE posts_post_search USING fts5("
+    "text, author, group_title, "
+    "tokenize = 'unicode61 remove_diacritics 2')",
+
+    "CREATE TRIGGER posts_post_search_insert AFTER INSERT ON posts_post "
+    "BEGIN INSERT INTO posts_post_search (rowid, text, author, group_title) "
+    f"VALUES ({POST_COLUMNS.format(row='new')}); END",
+
+    "CREATE TRIGGER posts_post_search_update "
+    "AFTER UPDATE OF text, author_id, group_id ON posts_post "
+    "BEGIN DELETE FROM posts_post_search WHERE rowid = old.id; "
+    "INSERT INTO posts_post_search (rowid, text, author, group_title) "
+    f"VALUES ({POST_COLUMNS.format(row='new')}); END",
+
+    "CREATE TRIGGER posts_post_search_delete AFTER DELETE ON posts_post "
+    "BEGIN DELETE FROM posts_post_search WHERE rowid = old.id; END",
+
+    "CREATE TRIGGER posts_post_search_author "
+    "AFTER UPDATE OF username ON auth_user "
+    "BEGIN UPDATE posts_post_search SET author = new.username "
+    "WHERE rowid IN (SELECT id FROM posts_post "
+    "WHERE author_id = new.id); END",
+
+    "CREATE TRIGGER posts_post_search_group "
+    "AFTER UPDATE OF title ON posts_group "
+    "BEGIN UPDATE posts_post_search SET group_title = new.title "
+    "WHERE rowid IN (SELECT id FROM posts_post "
+    "WHERE group_id = new.id); END",
+
+    "INSERT INTO posts_post_search (rowid, text, author, group_title) "
+    f"SELECT {POST_COLUMNS.format(row='posts_post')} FROM posts_post",
+]
+
+DROP = [
+    'DROP TRIGGER posts_post_search_group',
+    'DROP TRIGGER posts_post_search_author',
+    'DROP TRIGGER posts_post_search_delete',
+    'DROP TRIGGER posts_post_search_update',
+    'DROP TRIGGER posts_post_search_insert',
+    'DROP TABLE posts_post_search',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_media_files'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE, reverse_sql=DROP),
+    ]
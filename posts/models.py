@@ -1,8 +1,11 @@
 import textwrap
 
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -23,10 +26,28 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Loads the author and the group shown on a post card
+        together with the posts."""
+        return self.select_related('author', 'group')
+
+    def for_detail(self, user):
+        """Loads the post with everything its page shows about the
+        author, and whether the user follows the author."""
+        following = models.Value(False, output_field=models.BooleanField())
+        if user.is_authenticated:
+            following = models.Exists(Follow.objects.filter(
+                user=user, author=models.OuterRef('author')))
+        return self.for_feed().select_related(
+            'author__profile').annotate(following=following)
+
+
 class Post(models.Model):
     """The 'Posts' model is needed to create posts."""
     text = models.TextField('Текст поста', help_text='Напишите ваш пост')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                related_name='posts',
@@ -40,15 +61,44 @@ class Post(models.Model):
                               verbose_name='Сообщество'
                               )
     image = models.ImageField(upload_to='posts/',
+                              storage=ContentAddressedStorage(),
                               blank=True,
                               null=True,
                               verbose_name='Изображение'
                               )
+    image_width = models.PositiveIntegerField('Ширина изображения',
+                                              null=True,
+                                              blank=True,
+                                              editable=False
+                                              )
+    image_height = models.PositiveIntegerField('Высота изображения',
+                                               null=True,
+                                               blank=True,
+                                               editable=False
+                                               )
+    image_placeholder = models.TextField('Заглушка изображения',
+                                         blank=True,
+                                         editable=False
+                                         )
+    comment_count = models.PositiveIntegerField('Комментариев',
+                                                default=0,
+                                                editable=False
+                                                )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='post_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=('group', '-pub_date', '-id'),
+                         name='post_group_pub_date_idx'),
+        )
 
     def __str__(self):
         return textwrap.shorten(self.text, width=15, placeholder='...')
@@ -75,6 +125,10 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('-created',)
+        indexes = (
+            models.Index(fields=('post', '-created', '-id'),
+                         name='comment_post_created_idx'),
+        )
 
     def __str__(self):
         return textwrap.shorten(self.text, width=15, placeholder='...')
@@ -96,6 +150,85 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_follow'),
+            models.CheckConstraint(check=~models.Q(user=models.F('author')),
+                                   name='no_self_follow'),
+        )
 
     def __str__(self):
         return f'{self.user}/{self.author}'
+
+    def clean(self):
+        if self.user_id == self.author_id:
+            raise ValidationError('Нельзя подписаться на самого себя.')
+        duplicates = Follow.objects.filter(
+            user=self.user_id, author=self.author_id).exclude(pk=self.pk)
+        if duplicates.exists():
+            raise ValidationError('Такая подписка уже есть.')
+
+
+class Timeline(models.Model):
+    """The Timeline model stores the follow feed of every user:
+    a post is copied to the feed of each follower of its author."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Подписчик'
+                             )
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timelines',
+                             verbose_name='Пост'
+                             )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date', '-post')
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_timeline_post'),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-post'),
+                         name='timeline_user_pub_date_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.user}/{self.post_id}'
+
+
+class Profile(models.Model):
+    """The Profile model keeps the counters shown on the author card,
+    updated together with the posts and subscriptions they count."""
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                related_name='profile',
+                                verbose_name='Пользователь'
+                                )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписан', default=0)
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class MediaFile(models.Model):
+    """A stored upload and the number of posts that use it."""
+    name = models.CharField('Файл', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,85 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+GENERATION_KEY = 'feed_generation:{}'
+PAGE_KEY = 'feed_page:{feed}:{generation}:{cursor}'
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def author_feed(username):
+    return f'author:{username}'
+
+
+def _start(key):
+    """Starts a generation counter from the current time, so that
+    a counter evicted from the cache never repeats old values."""
+    cache.add(key, time.time_ns(), None)
+
+
+def generation(feed):
+    """Returns the current generation of the feed."""
+    key = GENERATION_KEY.format(feed)
+    generation = cache.get(key)
+    if generation is None:
+        _start(key)
+        generation = cache.get(key)
+    return generation
+
+
+def bump(*feeds):
+    """Moves the feeds to a new generation, so that the pages
+    cached for the previous one are never read again."""
+    for feed in feeds:
+        key = GENERATION_KEY.format(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            _start(key)
+
+
+def bump_post_feeds(author_username, *group_slugs):
+    """Bumps every feed that shows a post of the author
+    published in one of the groups."""
+    bump(index_feed(), author_feed(author_username),
+         *(group_feed(slug) for slug in group_slugs if slug))
+
+
+def cache_anonymous_page(feed):
+    """Caches the pages of a feed view served to anonymous users
+    until the generation of the feed changes.
+
+    `feed` maps the view arguments to the name of the feed."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            name = feed(*args, **kwargs)
+            cursor = request.GET.get('cursor', '')
+            key = PAGE_KEY.format(
+                feed=name,
+                generation=generation(name),
+                cursor=hashlib.md5(cursor.encode()).hexdigest(),
+            )
+            content = cache.get(key)
+            if content is not None:
+                return HttpResponse(content)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.content,
+                          settings.FEED_PAGE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,199 @@
+import base64
+import datetime as dt
+import json
+from math import ceil
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that keeps the number of objects in the cache under
+    count_key and stops counting past PAGINATOR_COUNT_LIMIT, so that
+    neither the COUNT nor the list of page links grows with the list.
+
+    Whoever adds or removes objects is expected to adjust the cached
+    count; it is recounted when it expires. With counted=False the
+    total is not shown at all, for lists too costly to keep counted."""
+
+    def __init__(self, object_list, per_page, count_key=None, counted=True,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.counted = counted
+        self.count_limit = settings.PAGINATOR_COUNT_LIMIT
+
+    @cached_property
+    def count(self):
+        """Return the number of objects, at most count_limit + 1."""
+        if self.count_key is not None:
+            count = cache.get(self.count_key)
+            if count is not None:
+                return count
+        count = self._bounded_count()
+        if self.count_key is not None:
+            cache.add(self.count_key, count,
+                      settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def _bounded_count(self):
+        bounded = self.object_list[:self.count_limit + 1]
+        try:
+            return bounded.count()
+        except (AttributeError, TypeError):
+            return len(bounded)
+
+    @property
+    def approximate(self):
+        """Whether the count is only a lower bound."""
+        return self.count > self.count_limit
+
+    @property
+    def total_pages(self):
+        """Return the number of pages implied by the count."""
+        hits = max(1, min(self.count, self.count_limit) - self.orphans)
+        return ceil(hits / self.per_page)
+
+    def page_window(self, number, on_each_side=2):
+        """Return the numbers of the pages around the given one."""
+        number = self.validate_number(number)
+        return range(max(number - on_each_side, 1),
+                     min(number + on_each_side, self.num_pages) + 1)
+
+
+class KeysetPaginator(CachedCountPaginator):
+    """Paginator that seeks by the sort keys of the last row shown
+    instead of using OFFSET, so page N costs the same as page 1.
+
+    Pages are addressed by opaque cursors; the page number is carried
+    inside the cursor so that the returned Page keeps working with
+    templates written for the stock Paginator. The keys must be
+    attributes of the rows and the last one must be unique."""
+
+    def __init__(self, object_list, per_page, keys=('-pub_date', '-id'),
+                 **kwargs):
+        self.keys = tuple(keys)
+        super().__init__(object_list.order_by(*self.keys), per_page,
+                         **kwargs)
+        self._number = 1
+        self._has_next = False
+
+    @property
+    def num_pages(self):
+        """Only the pages next to the current one are known."""
+        return self._number + int(self._has_next)
+
+    def get_page(self, cursor):
+        """Return the page for the cursor, or the first page
+        if the cursor is missing, broken or points past the end."""
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page(None)
+
+    def page(self, cursor):
+        """Return a Page object for the given cursor."""
+        if not cursor:
+            values, backwards, number = None, False, 1
+        else:
+            values, backwards, number = self._decode(cursor)
+        rows = list(self._fetch(values, backwards, self.per_page + 1))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if values is not None and not rows:
+            raise EmptyPage('That page contains no results')
+        if backwards:
+            rows.reverse()
+            self._has_next = True
+            number = max(number, 2) if has_more else 1
+        else:
+            self._has_next = has_more
+        self._number = number
+        page = self._get_page(rows, number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if self._has_next:
+            page.next_cursor = self._encode(rows[-1], False, number + 1)
+        if number > 2:
+            page.previous_cursor = self._encode(rows[0], True, number - 1)
+        return page
+
+    def cursor_after(self, row, number=1):
+        """Return the cursor of the page that follows the given row
+        shown on page `number`."""
+        return self._encode(row, False, number + 1)
+
+    def _fetch(self, values, backwards, limit):
+        queryset = self.object_list
+        if backwards:
+            queryset = queryset.reverse()
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        return queryset[:limit]
+
+    def _seek(self, values, backwards):
+        """Build the row-value comparison `keys > values` in the
+        direction of travel as nested Q objects."""
+        lookups = []
+        for key in self.keys:
+            descending = key.startswith('-') != backwards
+            lookups.append((key.lstrip('-'), 'lt' if descending else 'gt'))
+        field, lookup = lookups[-1]
+        condition = Q(**{f'{field}__{lookup}': values[-1]})
+        for (field, lookup), value in zip(lookups[-2::-1], values[-2::-1]):
+            condition = (Q(**{f'{field}__{lookup}': value})
+                         | Q(**{field: value}) & condition)
+        # A redundant non-strict bound on the leading key lets the
+        # database start an index range scan right at the cursor.
+        field, lookup = lookups[0]
+        return Q(**{f'{field}__{lookup}e': values[0]}) & condition
+
+    def _encode(self, row, backwards, number):
+        values = []
+        for key in self.keys:
+            value = getattr(row, key.lstrip('-'))
+            if isinstance(value, dt.datetime):
+                value = value.isoformat()
+            values.append(value)
+        data = json.dumps([values, int(backwards), number],
+                          separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def _decode(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4))
+            values, backwards, number = json.loads(data.decode())
+            number = int(number)
+            if (not isinstance(values, list)
+                    or len(values) != len(self.keys) or number < 1):
+                raise ValueError
+            values = [self._decode_value(key, value)
+                      for key, value in zip(self.keys, values)]
+        except (TypeError, ValueError, OverflowError, UnicodeDecodeError,
+                ValidationError):
+            raise InvalidCursor('That cursor is not valid')
+        return values, bool(backwards), number
+
+    def _decode_value(self, key, value):
+        """Return the value of the key read from a cursor, converted
+        by the field the key orders by; raise ValueError or
+        ValidationError for a value the field cannot hold."""
+        if (value is None or isinstance(value, (list, dict))
+                or isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63):
+            raise ValueError('Not a key value')
+        name = key.lstrip('-')
+        query, opts = self.object_list.query, self.object_list.model._meta
+        if name in query.annotations:
+            field = query.annotations[name].output_field
+        else:
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+        return field.to_python(value)
@@ -0,0 +1,163 @@
+"""Full-text search over posts with SQLite FTS5.
+
+posts_post_search holds the text, the author's username and the group
+title of every post under the post's id; triggers created by the
+migration keep it in step with posts, users and groups, whatever
+writes them."""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+TABLE = 'posts_post_search'
+
+# Characters that cannot occur in a post, marking the matched terms
+# in the snippets until the text around them is escaped.
+MARK_START, MARK_END = '\x02', '\x03'
+
+WORD = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """Turns what a user typed into an FTS5 query: every word must
+    occur, the last one possibly as a prefix. Returns None when the
+    query has no words."""
+    words = WORD.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def _newest_matches_clause(limit):
+    """Restricts a match to the newest `limit` matching posts, so that
+    ranking a common word costs the same however many posts use it."""
+    return (
+        f'rowid >= COALESCE((SELECT rowid FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s ORDER BY rowid DESC '
+        f'LIMIT 1 OFFSET {int(limit) - 1}), 0)')
+
+
+class SearchResults:
+    """Lazy list of the posts matching a query, the most relevant
+    first, among the newest SEARCH_MAX_RESULTS matches.
+
+    Slicing it does not query; iterating runs one FTS5 query for the
+    slice and one for its posts, each with .snippet attached: the
+    matched passage of the text, escaped, with terms in <mark>."""
+
+    def __init__(self, query, start=0, stop=None):
+        self.query = query
+        self.match = match_expression(query)
+        self.start = start
+        self.stop = stop
+        self._result_cache = None
+
+    def _bounds(self):
+        limit = settings.SEARCH_MAX_RESULTS
+        stop = limit if self.stop is None else min(self.stop, limit)
+        return max(stop - self.start, 0)
+
+    def count(self):
+        if self.match is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM (SELECT rowid FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s ORDER BY rowid DESC '
+                f'LIMIT %s OFFSET %s)',
+                [self.match, self._bounds(), self.start])
+            return cursor.fetchone()[0]
+
+    def _fetch(self):
+        if self.match is None or not self._bounds():
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({TABLE}, 0, %s, %s, '…', 32) "
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s AND '
+                f'{_newest_matches_clause(settings.SEARCH_MAX_RESULTS)} '
+                f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END, self.match, self.match,
+                 self._bounds(), self.start])
+            rows = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in rows])
+        results = []
+        for pk, snippet in rows:
+            if pk in posts:
+                post = posts[pk]
+                post.snippet = mark_safe(
+                    escape(snippet).replace(MARK_START, '<mark>')
+                    .replace(MARK_END, '</mark>'))
+                results.append(post)
+        return results
+
+    def _results(self):
+        if self._result_cache is None:
+            self._result_cache = self._fetch()
+        return self._result_cache
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self._results()[key]
+        if key.step is not None:
+            raise ValueError('Search results do not support steps.')
+        start = self.start + (key.start or 0)
+        stop = None if key.stop is None else self.start + key.stop
+        if self.stop is not None:
+            stop = self.stop if stop is None else min(stop, self.stop)
+        return SearchResults(self.query, start, stop)
+
+    def __iter__(self):
+        return iter(self._results())
+
+    def __len__(self):
+        return len(self._results())
+
+
+def matching(queryset, query):
+    """Filters a queryset of posts down to all the posts matching
+    the query, unranked."""
+    match = match_expression(query)
+    if match is None:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [match]))
+
+
+def rebuild(batch_size=1000):
+    """Refills the index from the posts, one range of ids per
+    transaction, and merges its segments; returns the posts indexed.
+
+    Each transaction replaces the index rows of its range with rows
+    read from the posts, so searches keep finding the rows of the
+    ranges not yet refilled and writers wait for one batch at most.
+    Posts written between batches are indexed by the triggers like
+    any other write, before or after their range is refilled."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT MAX(last) FROM (SELECT MAX(id) AS last '
+            f'FROM posts_post UNION ALL SELECT MAX(rowid) FROM {TABLE})')
+        last = cursor.fetchone()[0] or 0
+    indexed = 0
+    for start in range(0, last, batch_size):
+        bounds = [start, start + batch_size]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid > %s AND rowid <= %s',
+                bounds)
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, text, author, group_title) '
+                f'SELECT p.id, p.text, u.username, COALESCE(g.title, %s) '
+                f'FROM posts_post p JOIN auth_user u ON u.id = p.author_id '
+                f'LEFT JOIN posts_group g ON g.id = p.group_id '
+                f'WHERE p.id > %s AND p.id <= %s', [''] + bounds)
+            indexed += cursor.rowcount
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return indexed
@@ -0,0 +1,324 @@
+"""Receivers keeping the counters, the timelines and the caches in
+step with the models.
+
+The cache effects of a change wait for its transaction to commit:
+a reader caching the feeds in between would keep the old state under
+the new page generations or feed counts."""
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_migrate,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from . import (autocomplete, cards, counters, feeds, media, page_cache, tasks,
+               timelines)
+from .models import Comment, Follow, Group, Post, Profile
+
+User = get_user_model()
+
+# Deletions in progress in this thread: the posts, whose comments go
+# with them, and the usernames of the users and the slugs of the
+# groups of their posts, which go with the users.
+_deleting = threading.local()
+
+
+def _deletion():
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts, _deleting.usernames, _deleting.slugs = (
+            set(), {}, {})
+    return _deleting
+
+
+@receiver(pre_delete, sender=User)
+def mark_deleted_user(sender, instance, **kwargs):
+    """Keeps what the receivers of the user's posts, deleted with the
+    user, would otherwise query once per post."""
+    deletion = _deletion()
+    deletion.usernames[instance.pk] = instance.username
+    deletion.slugs.update(Group.objects.filter(
+        groups__author=instance).values_list('pk', 'slug').distinct())
+
+
+@receiver(post_delete, sender=User)
+def unmark_deleted_user(sender, instance, **kwargs):
+    deletion = _deletion()
+    deletion.usernames.pop(instance.pk, None)
+    if not deletion.usernames:
+        deletion.slugs.clear()
+
+
+@receiver(pre_delete, sender=Post)
+def mark_deleted_post(sender, instance, **kwargs):
+    """Lets the receivers of the post's comments, deleted with it,
+    leave the counter and the feeds of the post alone; the post's
+    own receivers take care of its feeds."""
+    _deletion().posts.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unmark_deleted_post(sender, instance, **kwargs):
+    _deletion().posts.discard(instance.pk)
+
+
+def _author_username(post):
+    return _deletion().usernames.get(post.author_id) or post.author.username
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Puts a new post into the timelines of the author's followers,
+    in a background task if the author has many of them."""
+    if not created:
+        return
+    followers = Profile.objects.filter(user=instance.author_id).values_list(
+        'followers_count', flat=True).first()
+    if followers and followers > settings.TIMELINE_INLINE_FAN_OUT:
+        tasks.fan_out_post.enqueue(instance.pk)
+    else:
+        timelines.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def forget_new_post_author_posts(sender, instance, created, **kwargs):
+    """Drops the cached list of posts of the new post's author."""
+    if created:
+        transaction.on_commit(
+            partial(feeds.forget_author_posts, instance.author_id))
+
+
+@receiver(post_delete, sender=Post)
+def forget_post(sender, instance, **kwargs):
+    """Drops the cached list of posts of the deleted post's author
+    and the cached cards of the post."""
+    transaction.on_commit(
+        partial(feeds.forget_author_posts, instance.author_id))
+    transaction.on_commit(partial(cards.forget_cards, instance))
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, **kwargs):
+    """Creates the counters of a new user."""
+    if created:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    """Counts a new post of the author."""
+    if created:
+        counters.change_posts(instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    """Uncounts a deleted post of the author, unless the author
+    goes too."""
+    if instance.author_id not in _deletion().usernames:
+        counters.change_posts(instance.author_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    """Counts a new comment of the post."""
+    if created:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    """Uncounts a deleted comment of the post, unless the post
+    goes too."""
+    if instance.post_id not in _deletion().posts:
+        counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Keeps the group the post was loaded with to find out
+    which group feed an edit moves it out of."""
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    """Keeps the name of the image the post was loaded with
+    to find out whether an edit replaces it."""
+    instance._loaded_image = str(instance.__dict__.get('image') or '')
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, created, **kwargs):
+    """Counts the post among the users of its stored image."""
+    if not created:
+        if instance.image.name == instance._loaded_image:
+            return
+        media.release(instance._loaded_image)
+    media.acquire(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    """Stops counting a deleted post among the users of its image."""
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def make_thumbnails(sender, instance, created, **kwargs):
+    """Queues the thumbnails of a new or replaced image."""
+    if instance.image and (created
+                           or instance.image.name != instance._loaded_image):
+        tasks.make_thumbnails.enqueue(instance.pk)
+    instance._loaded_image = instance.image.name or ''
+
+
+def _group_slugs(group_ids):
+    group_ids = {pk for pk in group_ids if pk}
+    known = _deletion().slugs
+    if group_ids <= known.keys():
+        return {pk: known[pk] for pk in group_ids}
+    return dict(Group.objects.filter(
+        pk__in=group_ids).values_list('pk', 'slug'))
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post_in_feeds(sender, instance, created, **kwargs):
+    """Adjusts the cached sizes of the feeds the post entered or left."""
+    old_group, new_group = instance._loaded_group_id, instance.group_id
+    if not created and old_group == new_group:
+        return
+    slugs = _group_slugs({old_group, new_group})
+    changes = []
+    if created:
+        changes.append((1, page_cache.index_feed(),
+                        page_cache.author_feed(instance.author.username)))
+    elif old_group in slugs:
+        changes.append((-1, page_cache.group_feed(slugs[old_group])))
+    if new_group in slugs:
+        changes.append((1, page_cache.group_feed(slugs[new_group])))
+    for change in changes:
+        transaction.on_commit(partial(feeds.change_counts, *change))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post_in_feeds(sender, instance, **kwargs):
+    """Shrinks the cached sizes of the feeds that showed the post."""
+    slugs = _group_slugs({instance.group_id})
+    transaction.on_commit(partial(
+        feeds.change_counts, -1, page_cache.index_feed(),
+        page_cache.author_feed(_author_username(instance)),
+        *(page_cache.group_feed(slug) for slug in slugs.values())))
+
+
+def _bump_post_feeds(post, group_ids):
+    slugs = _group_slugs(group_ids).values()
+    transaction.on_commit(partial(
+        page_cache.bump_post_feeds, _author_username(post), *slugs))
+
+
+@receiver(post_save, sender=Post)
+def bump_saved_post_feeds(sender, instance, **kwargs):
+    """Invalidates the cached pages of the feeds showing the post."""
+    _bump_post_feeds(instance, {instance.group_id,
+                                instance._loaded_group_id})
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def bump_deleted_post_feeds(sender, instance, **kwargs):
+    """Invalidates the cached pages of the feeds that showed the post."""
+    _bump_post_feeds(instance, {instance.group_id})
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_commented_post_feeds(sender, instance, **kwargs):
+    """Invalidates the cached pages showing the comment counter."""
+    if instance.post_id in _deletion().posts:
+        return
+    post = Post.objects.select_related('author').filter(
+        pk=instance.post_id).first()
+    if post is not None:
+        _bump_post_feeds(post, {post.group_id})
+
+
+@receiver(post_save, sender=Group)
+def bump_group_feed(sender, instance, **kwargs):
+    """Invalidates the cached pages of the edited group."""
+    transaction.on_commit(partial(
+        page_cache.bump, page_cache.group_feed(instance.slug)))
+
+
+@receiver(post_init, sender=Follow)
+def remember_follow_users(sender, instance, **kwargs):
+    """Keeps the users the subscription was loaded with
+    to find out whether an edit moves it to other users."""
+    instance._loaded_users = (instance.user_id, instance.author_id)
+
+
+def _follow_changed(user_id, author_id, delta):
+    counters.change_follows(user_id, author_id, delta)
+    if delta > 0:
+        timelines.backfill(user_id, author_id)
+    else:
+        timelines.prune(user_id, author_id)
+    page_cache.bump(*(
+        page_cache.author_feed(username)
+        for username in User.objects.filter(
+            pk__in=(user_id, author_id)).values_list('username', flat=True)))
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    """Counts a new or edited subscription, fills the subscriber's
+    timeline and invalidates the cached profile pages."""
+    users = (instance.user_id, instance.author_id)
+    if not created:
+        if users == instance._loaded_users:
+            return
+        _follow_changed(*instance._loaded_users, -1)
+    _follow_changed(*users, 1)
+    instance._loaded_users = users
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    """Uncounts a deleted subscription, including one deleted with
+    its user, and clears it from the subscriber's timeline."""
+    _follow_changed(instance.user_id, instance.author_id, -1)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    """Updates the user in the autocomplete index of this process,
+    unless the save leaves the indexed fields alone, as the one
+    recording each login does."""
+    if update_fields is None or not update_fields.isdisjoint(
+            autocomplete.USER_FIELDS):
+        autocomplete.index.update_user(instance)
+
+
+@receiver(post_save, sender=Group)
+def index_group(sender, instance, **kwargs):
+    """Updates the group in the autocomplete index of this process."""
+    autocomplete.index.update_group(instance)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def unindex_user_or_group(sender, instance, **kwargs):
+    """Removes the user or the group from the autocomplete index."""
+    kind = autocomplete.GROUP if sender is Group else autocomplete.USER
+    autocomplete.index.remove(kind, instance.pk)
+
+
+@receiver(post_migrate)
+def clear_cache(sender, **kwargs):
+    """Drops everything cached from the previous state of the database:
+    the cache is shared by workers and outlives migrate and flush."""
+    if sender.name == 'posts':
+        cache.clear()
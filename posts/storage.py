@@ -0,0 +1,53 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores every distinct content once, named by its SHA-256 in
+    two levels of shard directories: <upload_to>/ab/cd/abcd...<ext>.
+
+    Saving a file that is already stored only returns its name, so
+    identical uploads share the file and its thumbnails, and a stored
+    file that has gone missing is written again; posts.media
+    counts the references to every file."""
+
+    def get_available_name(self, name, max_length=None):
+        # The name is chosen by _save() from the content.
+        return name
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        key = digest.hexdigest()
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        return os.path.join(directory, key[:2], key[2:4], key + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        try:
+            # Touched, so that the collection of unused files in
+            # posts.media leaves it to the post being saved.
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        # A concurrent upload of the same content may create the file
+        # after the check, and FileSystemStorage would then retry the
+        # unchanged name forever. The content goes to a name of its own
+        # instead and replaces whatever identical file got there first.
+        partial = super()._save(os.path.join(
+            os.path.dirname(name), f'.{uuid.uuid4().hex}.part'), content)
+        try:
+            os.replace(self.path(partial), self.path(name))
+        except OSError:
+            self.delete(partial)
+            raise
+        return name
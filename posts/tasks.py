@@ -0,0 +1,30 @@
+from tasks.registry import task
+
+from . import thumbnails, timelines
+from .models import Post
+
+
+@task
+def fan_out_post(post_id):
+    """Copies a post to the timelines of its author's followers."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        timelines.fan_out(post)
+
+
+@task
+def fan_out_posts(post_ids):
+    """Copies posts of one author created in a batch to the
+    timelines of the author's followers."""
+    posts = list(Post.objects.filter(pk__in=post_ids).only(
+        'pk', 'author', 'pub_date'))
+    if posts:
+        timelines.fan_out_posts(posts[0].author_id, posts)
+
+
+@task
+def make_thumbnails(post_id):
+    """Makes the thumbnails of a post image outside the request."""
+    post = Post.objects.for_feed().filter(pk=post_id).first()
+    if post is not None and post.image:
+        thumbnails.generate(post)
@@ -0,0 +1,42 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+def _srcset(variants):
+    return ', '.join(f'{thumbnail.url} {width}w'
+                     for width, thumbnail in variants)
+
+
+@register.inclusion_tag('include/post_picture.html')
+def post_picture(post):
+    """Renders the card image of the post from the variants a worker
+    has made; unlike {% thumbnail %} it never resizes on render.
+    Resolve the variants of a whole page beforehand with
+    thumbnails.attach_pictures()."""
+    if not hasattr(post, 'picture_sources'):
+        thumbnails.attach_pictures([post])
+    sources = dict(post.picture_sources)
+    fallback = sources.pop(None, [])
+    width, height = settings.POST_CARD_SIZE
+    src = None
+    if fallback:
+        src = dict(fallback).get(width, fallback[-1][1])
+    return {
+        'ready': bool(fallback),
+        'sources': [
+            {'type': f'image/{image_format.lower()}',
+             'srcset': _srcset(variants)}
+            for image_format, variants in sources.items()
+        ],
+        'src': src,
+        'srcset': _srcset(fallback),
+        'sizes': settings.POST_CARD_SIZES,
+        'width': width,
+        'height': height,
+        'ratio': height / width * 100,
+        'placeholder': post.image_placeholder,
+    }
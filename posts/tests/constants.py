@@ -1,3 +1,5 @@
+import hashlib
+
 USERNAME_IVANOV = 'Ivanov'
 USERNAME_PETROV = 'Petrov'
 SLUG = 'test_url'
@@ -8,3 +10,6 @@ test_gif = (
     b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
     b'\x02\x4c\x01\x00\x3b'
 )
+TEST_GIF_DIGEST = hashlib.sha256(test_gif).hexdigest()
+TEST_GIF_NAME = (f'posts/{TEST_GIF_DIGEST[:2]}/{TEST_GIF_DIGEST[2:4]}/'
+                 f'{TEST_GIF_DIGEST}.gif')
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.admin import CommentAdmin, PostAdmin
+from posts.models import Comment, Follow, Post, Profile
+
+from . import constants as c
+
+User = get_user_model()
+
+
+class ScalableAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.ivanov = User.objects.create_user(username=c.USERNAME_IVANOV)
+        cls.petrov = User.objects.create_user(username=c.USERNAME_PETROV)
+        cls.posts = [
+            Post.objects.create(text=f'Пост номер {number}',
+                                author=(cls.ivanov, cls.petrov)[number % 2])
+            for number in range(5)
+        ]
+        for post in cls.posts:
+            Comment.objects.create(post=post, author=cls.petrov,
+                                   text='Комментарий')
+        Comment.objects.create(post=cls.posts[0], author=cls.ivanov,
+                               text='Ответ автора')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        return self.client.get(
+            reverse(f'admin:posts_{model}_changelist'), params)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Число запросов списка постов не зависит от числа строк."""
+        queries = []
+        for per_page in (1, 5):
+            with mock.patch.object(PostAdmin, 'list_per_page', per_page), \
+                    CaptureQueriesContext(connection) as captured:
+                self.changelist('post')
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+    @mock.patch.object(PostAdmin, 'list_per_page', 2)
+    def test_pages_by_cursor(self):
+        """Список постов листается курсорами вперёд и назад."""
+        expected = [post.pk for post in reversed(self.posts)]
+        response = self.changelist('post')
+        seen = []
+        while True:
+            cl = response.context['cl']
+            seen.extend(post.pk for post in cl.result_list)
+            if cl.next_url is None:
+                break
+            response = self.client.get(
+                reverse('admin:posts_post_changelist') + cl.next_url)
+        self.assertEqual(seen, expected)
+        self.assertEqual(cl.result_count, 5)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist') + cl.previous_url)
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            expected[2:4])
+
+    @mock.patch.object(CommentAdmin, 'list_per_page', 2)
+    def test_filters_by_typed_username(self):
+        """Фильтр по автору принимает имя пользователя и не выводит
+        список всех пользователей."""
+        response = self.changelist('comment', author=c.USERNAME_IVANOV)
+        self.assertEqual(
+            [comment.text for comment in response.context['cl'].result_list],
+            ['Ответ автора'])
+        self.assertNotContains(response, f'?author={c.USERNAME_PETROV}')
+
+    def test_search_uses_full_text_index(self):
+        """Поиск в админке находит посты через полнотекстовый индекс."""
+        response = self.changelist('post', q='номер 3')
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [self.posts[3].pk])
+
+    def test_adds_follow_with_its_counters(self):
+        """Подписка, добавленная в админке, получает номер, запись
+        в журнале и учитывается в счётчиках; повтор отклоняется."""
+        url = reverse('admin:posts_follow_add')
+        data = {'user': self.ivanov.pk, 'author': self.petrov.pk}
+        response = self.client.post(url, data)
+        follow = Follow.objects.get()
+        self.assertRedirects(
+            response, reverse('admin:posts_follow_changelist'))
+        self.assertEqual(LogEntry.objects.get().object_id, str(follow.pk))
+        self.assertEqual(
+            Profile.objects.get(user=self.petrov).followers_count, 1)
+        self.assertEqual(self.client.post(url, data).status_code, 200)
+        self.assertEqual(Follow.objects.count(), 1)
@@ -0,0 +1,121 @@
+import base64
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import follows
+from posts.models import Comment, Group, Post
+
+from . import constants as c
+from .utils import run_on_commit
+
+User = get_user_model()
+
+
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ivanov = User.objects.create_user(username=c.USERNAME_IVANOV)
+        cls.petrov = User.objects.create_user(username=c.USERNAME_PETROV)
+        cls.group = Group.objects.create(title='Группа', slug=c.SLUG)
+        cls.posts = [
+            Post.objects.create(text=f'Пост {number}', author=cls.petrov,
+                                group=cls.group if number % 2 else None)
+            for number in range(13)
+        ]
+        follows.follow(cls.ivanov, cls.petrov)
+        for number in range(3):
+            Comment.objects.create(post=cls.posts[0], author=cls.ivanov,
+                                   text=f'Комментарий {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_feeds_with_sparse_fields(self):
+        """Ленты листаются курсорами и отдают только запрошенные поля."""
+        for url, expected in (
+                (reverse('api_index'), self.posts),
+                (reverse('api_group', args=[c.SLUG]), self.posts[1::2]),
+                (reverse('api_profile', args=[c.USERNAME_PETROV]),
+                 self.posts)):
+            with self.subTest(url=url):
+                seen, cursor = [], None
+                while True:
+                    params = {'fields': 'id,author'}
+                    if cursor:
+                        params['cursor'] = cursor
+                    data = self.client.get(url, params).json()
+                    seen.extend(data['results'])
+                    cursor = data['next_cursor']
+                    if cursor is None:
+                        break
+                self.assertEqual(seen, [
+                    {'id': post.pk, 'author': c.USERNAME_PETROV}
+                    for post in reversed(expected)])
+                self.assertEqual(data['count'], len(expected))
+
+    def test_rejects_unknown_fields_and_cursors(self):
+        """Неизвестное поле даёт 400, испорченный курсор и
+        несуществующий автор дают 404."""
+        url = reverse('api_index')
+        self.assertEqual(
+            self.client.get(url, {'fields': 'id,password'}).status_code, 400)
+        for cursor in ('сломан', '[{"a":1},1]', '[["x",1],0,2]',
+                       '[["2021-02-30T00:00:00",1],0,2]',
+                       '[["2021-02-01T00:00:00",null],0,2]',
+                       '[["2021-02-01T00:00:00",1e400],0,2]',
+                       '[["2021-02-01T00:00:00",99999999999999999999],0,2]'):
+            with self.subTest(cursor=cursor):
+                if cursor.startswith('['):
+                    cursor = base64.urlsafe_b64encode(
+                        cursor.encode()).decode().rstrip('=')
+                self.assertEqual(self.client.get(
+                    url, {'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get(
+            reverse('api_profile', args=['nobody'])).status_code, 404)
+
+    def test_revalidates_public_feed_without_queries(self):
+        """Повторный запрос ленты с ETag получает 304 без запросов
+        к базе, пока в ленте ничего не изменилось."""
+        url = reverse('api_index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.ivanov)
+        run_on_commit()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'],
+                         'Новый пост')
+
+    @override_settings(FOLLOW_FEED_ENGINE='query')
+    def test_follow_feed_needs_login(self):
+        """Лента подписок доступна только вошедшему пользователю."""
+        url = reverse('api_follow_index')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.ivanov)
+        response = self.client.get(url, {'fields': 'id'})
+        self.assertEqual(response.json()['results'][0],
+                         {'id': self.posts[-1].pk})
+        self.assertEqual(self.client.get(
+            url, {'fields': 'id'},
+            HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    @override_settings(COMMENTS_PAGINATE_BY=2)
+    def test_post_with_comments(self):
+        """Запись отдаётся вместе с первой страницей комментариев."""
+        post = self.posts[0]
+        url = reverse('api_post', args=[c.USERNAME_PETROV, post.pk])
+        data = self.client.get(url, {'fields': 'text,comment_count'}).json()
+        self.assertEqual(data['post'],
+                         {'text': post.text, 'comment_count': 3})
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         ['Комментарий 2', 'Комментарий 1'])
+        data = self.client.get(url, {'cursor': data['next_cursor']}).json()
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         ['Комментарий 0'])
+        self.assertEqual(self.client.get(reverse(
+            'api_post', args=[c.USERNAME_IVANOV, post.pk])).status_code, 404)
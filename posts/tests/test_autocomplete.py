@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import autocomplete
+from posts.models import Group
+
+from . import constants as c
+
+User = get_user_model()
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ivanov = User.objects.create_user(
+            username=c.USERNAME_IVANOV, first_name='Иван',
+            last_name='Иванов')
+        cls.petrov = User.objects.create_user(username=c.USERNAME_PETROV)
+        cls.group = Group.objects.create(title='Любители котов',
+                                         slug=c.SLUG)
+
+    def setUp(self):
+        autocomplete.index.clear()
+
+    def values(self, prefix, limit=None):
+        return [value for _, value, _
+                in autocomplete.index.lookup(prefix, limit)]
+
+    def test_matches_names_titles_and_their_words(self):
+        """Подсказки находят авторов и сообщества по началу имени,
+        фамилии, адреса и любого слова названия без учёта регистра."""
+        self.assertEqual(self.values('iv'), [c.USERNAME_IVANOV])
+        self.assertEqual(self.values('ИВАНО'), [c.USERNAME_IVANOV])
+        self.assertEqual(self.values('кот'), [c.SLUG])
+        self.assertEqual(self.values('test_'), [c.SLUG])
+        self.assertEqual(self.values('p', limit=1), [c.USERNAME_PETROV])
+        self.assertEqual(self.values('  '), [])
+
+    def test_follows_changes_of_users_and_groups(self):
+        """Загруженный индекс обновляется при переименовании,
+        создании и удалении авторов и сообществ."""
+        self.values('i')
+        ivanov = User.objects.get(pk=self.ivanov.pk)
+        ivanov.username = 'Sidorov'
+        ivanov.save()
+        self.assertEqual(self.values('iv'), [])
+        self.assertEqual(self.values('sid'), ['Sidorov'])
+        Group.objects.create(title='Собачники', slug='dogs')
+        self.assertEqual(self.values('соб'), ['dogs'])
+        Group.objects.get(pk=self.group.pk).delete()
+        self.assertEqual(self.values('кот'), [])
+
+    def test_login_leaves_index_alone(self):
+        """Сохранение пользователя при входе не трогает индекс."""
+        with mock.patch.object(autocomplete.index, 'update_user') as update:
+            self.client.force_login(self.petrov)
+            User.objects.get(pk=self.petrov.pk).save(
+                update_fields=['last_login'])
+        update.assert_not_called()
+
+    def test_changes_during_reload_are_kept(self):
+        """Изменения, сделанные во время перезагрузки устаревшего
+        индекса, попадают в новый индекс."""
+        self.values('i')
+        index = autocomplete.index
+        index._loaded -= settings.AUTOCOMPLETE_MAX_AGE + 1
+        build = index._build
+
+        def build_then_add_group():
+            built = build()
+            Group.objects.create(title='Собачники', slug='dogs')
+            return built
+
+        with mock.patch.object(index, '_build', build_then_add_group):
+            self.assertEqual(self.values('соб'), ['dogs'])
+        self.assertEqual(self.values('соб'), ['dogs'])
+
+    def test_users_named_like_routes_keep_their_profiles(self):
+        """Поиск и подсказки не закрывают профили пользователей
+        с такими именами."""
+        for username in ('search', 'autocomplete'):
+            User.objects.create_user(username=username)
+            with self.subTest(username=username):
+                response = self.client.get(
+                    reverse('profile', args=[username]))
+                self.assertEqual(response.context['selected_user'].username,
+                                 username)
+
+    def test_endpoint_returns_json(self):
+        """Точка подсказок отдаёт JSON с адресами страниц."""
+        response = self.client.get(reverse('autocomplete'),
+                                   {'q': 'люб', 'limit': 'много'})
+        self.assertEqual(response.json(), {'results': [{
+            'type': 'group',
+            'value': c.SLUG,
+            'label': 'Любители котов',
+            'url': reverse('group', args=[c.SLUG]),
+        }]})
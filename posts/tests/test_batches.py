@@ -0,0 +1,136 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import feeds, follows, page_cache, search
+from posts.models import Comment, Group, Post, Timeline
+
+from . import constants as c
+from .utils import run_on_commit
+
+User = get_user_model()
+
+PASSWORD = 'пароль-для-пакетов'
+
+
+class BatchApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ivanov = User.objects.create_user(username=c.USERNAME_IVANOV,
+                                              password=PASSWORD)
+        cls.petrov = User.objects.create_user(username=c.USERNAME_PETROV)
+        cls.group = Group.objects.create(title='Группа', slug=c.SLUG)
+        follows.follow(cls.petrov, cls.ivanov)
+        cls.post = Post.objects.create(text='Пост', author=cls.petrov)
+
+    def setUp(self):
+        cache.clear()
+
+    def send(self, name, items, client=None, password=PASSWORD):
+        credentials = base64.b64encode(
+            f'{c.USERNAME_IVANOV}:{password}'.encode()).decode()
+        return (client or self.client).post(
+            reverse(name), json.dumps({'items': items}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+    def test_creates_valid_posts_with_their_side_effects(self):
+        """Пакет создаёт допустимые посты, сообщает об ошибках
+        остальных и один раз обновляет счётчики, ленты и кэши."""
+        index = page_cache.generation(page_cache.index_feed())
+        cache.set(feeds.count_key(page_cache.index_feed()), 1, None)
+        data = self.send('api_posts_batch', [
+            {'text': 'Пакетный пост', 'group': self.group.pk},
+            {'text': ''},
+            'не объект',
+            {'text': 'Второй пакетный пост'},
+        ]).json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([sorted(result) for result in data['results']],
+                         [['id', 'index', 'url'], ['errors', 'index'],
+                          ['errors', 'index'], ['id', 'index', 'url']])
+        self.assertIn('text', data['results'][1]['errors'])
+        created = Post.objects.filter(author=self.ivanov).order_by('pk')
+        self.assertEqual(
+            [(post.pk, post.group_id) for post in created],
+            [(data['results'][0]['id'], self.group.pk),
+             (data['results'][3]['id'], None)])
+        self.ivanov.profile.refresh_from_db()
+        self.assertEqual(self.ivanov.profile.posts_count, 2)
+        self.assertEqual(Timeline.objects.filter(
+            user=self.petrov, post__author=self.ivanov).count(), 2)
+        self.assertEqual(
+            cache.get(feeds.count_key(page_cache.index_feed())), 1)
+        self.assertEqual(
+            page_cache.generation(page_cache.index_feed()), index)
+        run_on_commit()
+        self.assertEqual(
+            cache.get(feeds.count_key(page_cache.index_feed())), 3)
+        self.assertNotEqual(
+            page_cache.generation(page_cache.index_feed()), index)
+        self.assertEqual(len(list(search.SearchResults('пакетный'))), 2)
+
+    def test_side_effects_do_not_grow_with_batch(self):
+        """Число запросов не растёт с размером пакета."""
+        queries = []
+        for size in (2, 10):
+            with CaptureQueriesContext(connection) as captured:
+                self.send('api_posts_batch',
+                          [{'text': f'Пост {n}'} for n in range(size)])
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_creates_comments(self):
+        """Пакет комментариев создаёт комментарии к существующим
+        записям и обновляет их счётчики, а кэш страниц сбрасывает
+        после фиксации."""
+        index = page_cache.generation(page_cache.index_feed())
+        data = self.send('api_comments_batch', [
+            {'post': self.post.pk, 'text': 'Первый'},
+            {'post': self.post.pk, 'text': 'Второй'},
+            {'post': 0, 'text': 'К несуществующей записи'},
+            {'post': [self.post.pk], 'text': 'Неверный номер'},
+        ]).json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual(data['results'][0]['post'], self.post.pk)
+        self.assertIn('errors', data['results'][2])
+        self.assertIn('errors', data['results'][3])
+        self.assertEqual(
+            list(Comment.objects.filter(post=self.post).order_by(
+                'pk').values_list('pk', 'text')),
+            [(data['results'][0]['id'], 'Первый'),
+             (data['results'][1]['id'], 'Второй')])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(
+            page_cache.generation(page_cache.index_feed()), index)
+        run_on_commit()
+        self.assertNotEqual(
+            page_cache.generation(page_cache.index_feed()), index)
+
+    def test_rejects_unauthenticated_and_malformed_requests(self):
+        """Без входа или с неверным телом пакет отклоняется."""
+        url = reverse('api_posts_batch')
+        item = [{'text': 'Пост'}]
+        self.assertEqual(self.send('api_posts_batch', item,
+                                   password='wrong').status_code, 401)
+        self.assertEqual(self.client.post(
+            url, json.dumps({'items': item}),
+            content_type='application/json').status_code, 401)
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(self.ivanov)
+        self.assertEqual(csrf_client.post(
+            url, json.dumps({'items': item}),
+            content_type='application/json').status_code, 401)
+        self.assertEqual(self.send('api_posts_batch',
+                                   item * 101).status_code, 400)
+        self.client.force_login(self.ivanov)
+        self.assertEqual(self.client.post(
+            url, 'не json', content_type='application/json').status_code, 400)
+        self.assertFalse(Post.objects.filter(author=self.ivanov).exists())
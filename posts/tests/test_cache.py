@@ -0,0 +1,78 @@
+import multiprocessing
+import tempfile
+
+from django.test import SimpleTestCase
+
+from yatube.cache import TwoTierCache
+
+
+def _set_in_worker(location, key, value):
+    TwoTierCache(location, {}).set(key, value)
+
+
+def _incr_in_worker(location, key, times):
+    cache = TwoTierCache(location, {})
+    for _ in range(times):
+        cache.incr(key)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = f'{directory.name}/cache.sqlite3'
+        self.cache = TwoTierCache(self.location, {})
+
+    def start_worker(self, target, *args):
+        worker = multiprocessing.get_context('fork').Process(
+            target=target, args=(self.location, *args))
+        worker.start()
+        return worker
+
+    def join_worker(self, worker):
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+
+    def run_in_worker(self, target, *args):
+        self.join_worker(self.start_worker(target, *args))
+
+    def test_write_in_other_process_invalidates_local_copy(self):
+        """Запись в другом процессе сразу видна процессу,
+        который держит старое значение в памяти."""
+        self.cache.set('feed', 'старое')
+        self.assertEqual(self.cache.get('feed'), 'старое')
+        self.run_in_worker(_set_in_worker, 'feed', 'новое')
+        self.assertEqual(self.cache.get('feed'), 'новое')
+
+    def test_add_incr_and_delete(self):
+        """add не перезаписывает живой ключ, incr атомарно
+        увеличивает значение, удалённый ключ не читается из памяти."""
+        self.assertTrue(self.cache.add('generation', 1))
+        self.assertFalse(self.cache.add('generation', 5))
+        self.assertEqual(self.cache.incr('generation'), 2)
+        self.assertEqual(self.cache.get_many(['generation', 'missing']),
+                         {'generation': 2})
+        self.cache.delete('generation')
+        self.assertIsNone(self.cache.get('generation'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('generation')
+
+    def test_clear_drops_copies_of_all_processes(self):
+        """clear в одном процессе сбрасывает значения,
+        закешированные в памяти другого."""
+        self.cache.set('card', 'карточка')
+        self.cache.get('card')
+        self.run_in_worker(lambda location: TwoTierCache(location, {}).clear())
+        self.assertIsNone(self.cache.get('card'))
+
+    def test_interleaved_writes_leave_latest_value_current(self):
+        """При одновременных записях нескольких процессов в памяти
+        каждого остаётся последнее значение, а не более старое."""
+        self.cache.set('generation', 0)
+        workers = [self.start_worker(_incr_in_worker, 'generation', 100)
+                   for _ in range(3)]
+        for _ in range(100):
+            self.cache.incr('generation')
+        for worker in workers:
+            self.join_worker(worker)
+        self.assertEqual(self.cache.get('generation'), 400)
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.feeds import change_counts, count_key, follow_feed_paginator
+from posts.models import Follow, Post
+from posts.page_cache import index_feed
+
+from . import constants as c
+from .utils import run_on_commit
+
+User = get_user_model()
+
+
+class FollowFeedEngineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+        authors = [User.objects.create_user(username=f'author_{number}')
+                   for number in range(3)]
+        for author in authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+        for number in range(24):
+            Post.objects.create(text=f'Пост {number}',
+                                author=authors[number % 3])
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, engine):
+        """Returns all pages of the follow feed, going forward
+        and then back from the last page."""
+        with self.settings(FOLLOW_FEED_ENGINE=engine):
+            paginator = follow_feed_paginator(FollowFeedEngineTests.user, 5)
+            pages = [list(paginator.page(None))]
+            page = paginator.page(None)
+            while page.has_next():
+                page = follow_feed_paginator(
+                    FollowFeedEngineTests.user, 5).page(page.next_cursor)
+                pages.append(list(page))
+            while page.previous_cursor:
+                page = follow_feed_paginator(
+                    FollowFeedEngineTests.user, 5).page(page.previous_cursor)
+                pages.append(list(page))
+        return pages
+
+    @override_settings(FOLLOW_FEED_CACHED_POSTS=3)
+    def test_engines_build_the_same_feed(self):
+        """Все движки ленты подписок отдают одинаковые страницы,
+        в том числе когда кэш последних постов автора исчерпан."""
+        expected = self.walk('query')
+        self.assertEqual(len(expected), 4 + 2)
+        for engine in ('timeline', 'merge'):
+            with self.subTest(engine=engine):
+                self.assertEqual(self.walk(engine), expected)
+
+    def test_merge_engine_sees_new_posts(self):
+        """Новый пост сбрасывает кэш последних постов автора
+        и сразу виден в ленте."""
+        with self.settings(FOLLOW_FEED_ENGINE='merge'):
+            follow_feed_paginator(FollowFeedEngineTests.user, 5).page(None)
+            author = Follow.objects.filter(
+                user=FollowFeedEngineTests.user).first().author
+            post = Post.objects.create(text='Свежий пост', author=author)
+            run_on_commit()
+            page = follow_feed_paginator(
+                FollowFeedEngineTests.user, 5).page(None)
+        self.assertEqual(page[0], post)
+
+    def test_follow_feed_is_not_counted(self):
+        """Лента подписок не считает свои посты
+        и не показывает их общее число."""
+        self.client.force_login(FollowFeedEngineTests.user)
+        for engine in ('timeline', 'merge', 'query'):
+            with self.subTest(engine=engine), self.settings(
+                    FOLLOW_FEED_ENGINE=engine), CaptureQueriesContext(
+                    connection) as queries:
+                response = self.client.get(reverse('follow_index'))
+            self.assertFalse(response.context['page'].paginator.counted)
+            self.assertNotContains(response, 'из ')
+            self.assertFalse([query for query in queries
+                              if 'COUNT' in query['sql']])
+
+
+class FeedCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PAGINATOR_COUNT_LIMIT=2)
+    def test_capped_count_is_dropped_instead_of_decreased(self):
+        """Размер ленты сверх предела при удалении поста
+        сбрасывается, а не уменьшается до точного на вид числа."""
+        key = count_key(index_feed())
+        cache.set(key, 3)
+        change_counts(1, index_feed())
+        self.assertEqual(cache.get(key), 4)
+        change_counts(-1, index_feed())
+        self.assertIsNone(cache.get(key))
+        cache.set(key, 2)
+        change_counts(-1, index_feed())
+        self.assertEqual(cache.get(key), 1)
@@ -1,19 +1,32 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Post
+from tasks import worker
 
 from . import constants as c
 
 User = get_user_model()
 
 
+def camera_photo(size):
+    """Returns a JPEG upload with EXIF data."""
+    exif = Image.Exif()
+    exif[0x010f] = 'Камера'
+    data = BytesIO()
+    Image.new('RGB', size, 'red').save(data, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name='photo.jpg', content=data.getvalue(),
+                              content_type='image/jpeg')
+
+
 class PostFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -77,3 +90,55 @@ class PostFormTests(TestCase):
                               kwargs={'username': c.USERNAME_IVANOV,
                                       'post_id': self.post_id}))
         self.assertEqual(post.text, 'изменённый пост')
+
+    def test_thumbnails_are_made_outside_the_request(self):
+        """Проверяет, что размер картинки сохраняется при загрузке,
+        а миниатюры нескольких ширин и форматов с размытой заглушкой
+        делает фоновая задача; до этого страница показывает заглушку."""
+        form_data = {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(
+                name='thumb.gif',
+                content=c.test_gif,
+                content_type='image/gif'
+            )
+        }
+        self.authorized_client.post(reverse('new_post'), data=form_data)
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual((post.image_width, post.image_height), (1, 1))
+        url = reverse('post', kwargs={'username': c.USERNAME_IVANOV,
+                                      'post_id': post.pk})
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Миниатюра ещё готовится')
+        self.assertNotContains(response, '<img class="card-img"')
+        self.assertEqual(worker.work(once=True), 1)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, '<img class="card-img"')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '480w')
+        self.assertContains(response, 'data:image/jpeg;base64,')
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_uploads_are_normalized(self):
+        """Проверяет, что большая фотография уменьшается
+        и сохраняется без EXIF."""
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Фото', 'image': camera_photo((300, 150))})
+        post = Post.objects.get(text='Фото')
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image) as stored:
+            self.assertEqual(stored.size, (100, 50))
+            self.assertFalse(stored.getexif())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_oversized_uploads_are_rejected(self):
+        """Проверяет, что изображение с огромным числом пикселей
+        отклоняется формой."""
+        response = self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Бомба', 'image': camera_photo((20, 20))})
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение слишком большое: не больше 0 '
+                             'мегапикселей.')
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
@@ -0,0 +1,76 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import KeysetPaginator
+from posts.timelines import TIMELINE_KEYS, timeline_posts
+
+from . import constants as c
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+        cls.group = Group.objects.create(
+            title='Тестовое название сообщества',
+            slug=c.SLUG,
+            description='Тестовое описание сообщества'
+        )
+        cls.post = Post.objects.create(text='Пост', author=cls.user,
+                                       group=cls.group)
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, queryset):
+        plan = self.query_plan(queryset)
+        for step in plan:
+            self.assertNotRegex(step, FULL_SCAN, plan)
+            self.assertNotIn('TEMP B-TREE', step, plan)
+
+    def test_feed_queries_use_indexes(self):
+        """Главные запросы лент читают индексы без полного
+        просмотра таблиц и без сортировки во временном B-дереве."""
+        feeds = {
+            'index': (Post.objects.for_feed(), ('-pub_date', '-id')),
+            'group': (Post.objects.for_feed().filter(
+                group=QueryPlanTests.group), ('-pub_date', '-id')),
+            'profile': (Post.objects.for_feed().filter(
+                author=QueryPlanTests.user), ('-pub_date', '-id')),
+            'follow': (timeline_posts(QueryPlanTests.user), TIMELINE_KEYS),
+        }
+        cursor = [timezone.now(), QueryPlanTests.post.pk]
+        for name, (queryset, keys) in feeds.items():
+            paginator = KeysetPaginator(queryset, 10, keys=keys)
+            for values in (None, cursor):
+                for backwards in (False, True):
+                    with self.subTest(feed=name, cursor=values,
+                                      backwards=backwards):
+                        self.assertUsesIndexes(
+                            paginator._fetch(values, backwards, 11))
+
+    def test_detail_queries_use_indexes(self):
+        """Запросы комментариев и подписок используют индексы."""
+        queries = {
+            'comments': Comment.objects.filter(post=QueryPlanTests.post),
+            'following': Follow.objects.filter(
+                user=QueryPlanTests.user).values_list('author', flat=True),
+            'subscription': Follow.objects.filter(
+                user=QueryPlanTests.user, author=QueryPlanTests.user),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                self.assertUsesIndexes(queryset)
@@ -0,0 +1,199 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default, get_thumbnail
+
+from posts import media
+from posts.models import MediaFile, Post
+from posts.storage import ContentAddressedStorage
+
+from . import constants as c
+
+User = get_user_model()
+
+
+def upload(name, content=c.test_gif):
+    return SimpleUploadedFile(name=name, content=content,
+                              content_type='image/gif')
+
+
+class MediaStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def references(self, name):
+        return MediaFile.objects.get(name=name).references
+
+    def test_identical_uploads_share_one_counted_file(self):
+        """Одинаковые загрузки хранятся одним файлом в каталоге
+        по хешу содержимого, а число ссылок на него считается."""
+        first = Post.objects.create(text='Первый', author=self.user,
+                                    image=upload('cat.gif'))
+        second = Post.objects.create(text='Второй', author=self.user,
+                                     image=upload('copy of cat.GIF'))
+        self.assertEqual(first.image.name, c.TEST_GIF_NAME)
+        self.assertEqual(second.image.name, c.TEST_GIF_NAME)
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(c.TEST_GIF_NAME)])
+        self.assertEqual(self.references(c.TEST_GIF_NAME), 2)
+
+        first.delete()
+        self.assertEqual(self.references(c.TEST_GIF_NAME), 1)
+        second.image = upload('dog.gif', c.test_gif + b'\x00')
+        second.save()
+        self.assertEqual(self.references(c.TEST_GIF_NAME), 0)
+        self.assertEqual(self.references(second.image.name), 1)
+
+    def test_concurrent_identical_upload_keeps_one_file(self):
+        """Если одинаковый файл появился после проверки, сохранение
+        не зацикливается и оставляет один файл."""
+        storage = ContentAddressedStorage(location=settings.MEDIA_ROOT)
+        name = storage.save('posts/cat.gif', ContentFile(c.test_gif))
+        with mock.patch('posts.storage.os.utime',
+                        side_effect=FileNotFoundError):
+            self.assertEqual(
+                storage.save('posts/cat.gif', upload('cat.gif')), name)
+        self.assertEqual(os.listdir(os.path.dirname(storage.path(name))),
+                         [os.path.basename(name)])
+
+
+class MediaCollectionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Overridden rather than assigned, so that the storages, and
+        # the ones sorl-thumbnail restores from its store, agree on it.
+        cls.media_root = override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+        cls.media_root.enable()
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media_root.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.storage = Post._meta.get_field('image').storage
+        kept = Post.objects.create(text='Оставленный', author=self.user,
+                                   image=upload('kept.gif'))
+        deleted = Post.objects.create(
+            text='Удалённый', author=self.user,
+            image=upload('deleted.gif', c.test_gif + b'\x00'))
+        self.kept = [
+            (self.storage, kept.image.name),
+            (default.storage, get_thumbnail(kept.image, '10x10').name)]
+        self.orphans = [
+            (self.storage, deleted.image.name),
+            (default.storage, get_thumbnail(deleted.image, '10x10').name)]
+        deleted.delete()
+        for name, storage in (('posts/ff/ff/stray.gif', self.storage),
+                              ('cache/ff/ff/stray.jpg', default.storage)):
+            name = storage.save(name, ContentFile(c.test_gif))
+            self.orphans.append((storage, name))
+        for storage, name in self.orphans:
+            self.age(storage, name)
+
+    def age(self, storage, name):
+        long_ago = time.time() - 2 * settings.MEDIA_GC_GRACE
+        os.utime(storage.path(name), (long_ago, long_ago))
+
+    def exists(self, storage, name):
+        return os.path.exists(storage.path(name))
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_media', '--rate=0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_lists_orphans_and_removes_nothing(self):
+        """Пробный запуск перечисляет ненужные файлы,
+        но ничего не удаляет."""
+        out = self.collect('--dry-run')
+        for storage, name in self.orphans:
+            self.assertTrue(self.exists(storage, name), name)
+        for _, name in self.orphans[:1] + self.orphans[2:]:
+            self.assertIn(name, out)
+
+    def test_removes_orphans_and_keeps_used_files(self):
+        """Удаляются исходники удалённых постов, их миниатюры и
+        бесхозные файлы, а файлы живых постов остаются."""
+        self.collect()
+        for storage, name in self.orphans:
+            self.assertFalse(self.exists(storage, name), name)
+        for storage, name in self.kept:
+            self.assertTrue(self.exists(storage, name), name)
+        self.assertFalse(MediaFile.objects.filter(
+            name=self.orphans[0][1]).exists())
+
+    def test_keeps_released_file_uploaded_again(self):
+        """Освобождённый файл, который только что загрузили снова,
+        не удаляется, а пропавший файл загрузка записывает заново."""
+        name = self.orphans[0][1]
+        upload_again = upload('again.gif', c.test_gif + b'\x00')
+        self.assertEqual(self.storage.save('posts/again.gif', upload_again),
+                         name)
+        self.collect()
+        self.assertTrue(self.exists(self.storage, name))
+        self.assertTrue(MediaFile.objects.filter(name=name).exists())
+
+        os.remove(self.storage.path(name))
+        post = Post.objects.create(
+            text='Снова', author=self.user,
+            image=upload('again.gif', c.test_gif + b'\x00'))
+        self.assertEqual(post.image.name, name)
+        self.assertTrue(self.exists(self.storage, name))
+
+    def test_keeps_file_uploaded_again_while_removed(self):
+        """Файл, который загрузили снова в момент удаления,
+        остаётся на месте вместе со своим счётчиком."""
+        name = self.orphans[0][1]
+        rename = os.rename
+
+        def upload_then_rename(source, destination):
+            self.storage.save('posts/again.gif',
+                              upload('again.gif', c.test_gif + b'\x00'))
+            rename(source, destination)
+
+        with mock.patch('posts.media.os.rename',
+                        side_effect=upload_then_rename):
+            self.assertFalse(media._remove_unused(name))
+        self.assertTrue(self.exists(self.storage, name))
+        self.assertTrue(MediaFile.objects.filter(name=name).exists())
+        self.assertEqual(os.listdir(os.path.dirname(
+            self.storage.path(name))), [os.path.basename(name)])
+
+    def test_resumes_where_previous_run_stopped(self):
+        """Сборка, прерванная после лимита, продолжается
+        следующим запуском с того же места."""
+        self.collect('--batch-size=1', '--limit=1')
+        self.assertIsNotNone(cache.get(media.PROGRESS_KEY))
+        for _ in range(100):
+            if cache.get(media.PROGRESS_KEY) is None:
+                break
+            self.collect('--batch-size=1', '--limit=1')
+        self.assertIsNone(cache.get(media.PROGRESS_KEY))
+        for storage, name in self.orphans:
+            self.assertFalse(self.exists(storage, name), name)
@@ -1,9 +1,14 @@
 import textwrap
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Group, Post
+from posts import follows
+from posts.models import Comment, Follow, Group, Post, Profile
 
 from . import constants as c
 
@@ -68,3 +73,146 @@ class PostModelTest(TestCase):
         expected_object_name = textwrap.shorten(
             post.text, width=15, placeholder='...')
         self.assertEquals(expected_object_name, str(post))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+        cls.author = User.objects.create_user(username=c.USERNAME_PETROV)
+
+    def test_counters_follow_changes(self):
+        """Счётчики постов, комментариев и подписок меняются
+        при создании и удалении записей."""
+        post = Post.objects.create(text='Пост', author=CountersTest.author)
+        comment = Comment.objects.create(
+            text='Комментарий', author=CountersTest.user, post=post)
+        follows.follow(CountersTest.user, CountersTest.author)
+        post.refresh_from_db()
+        author = Profile.objects.get(user=CountersTest.author)
+        user = Profile.objects.get(user=CountersTest.user)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(user.following_count, 1)
+        comment.delete()
+        follows.unfollow(CountersTest.user, CountersTest.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(
+            Profile.objects.get(user=CountersTest.author).followers_count, 0)
+        post.delete()
+        self.assertEqual(
+            Profile.objects.get(user=CountersTest.author).posts_count, 0)
+
+    def test_follow_counters_survive_direct_changes(self):
+        """Счётчики подписок верны и при работе с подписками
+        напрямую, при их правке и при удалении пользователя."""
+        other = User.objects.create_user(username='sidorov')
+        follow = Follow.objects.create(user=CountersTest.user,
+                                       author=CountersTest.author)
+        follow.author = other
+        follow.save()
+
+        def counts(user):
+            profile = Profile.objects.get(user=user)
+            return profile.followers_count, profile.following_count
+
+        self.assertEqual(counts(CountersTest.author), (0, 0))
+        self.assertEqual(counts(other), (1, 0))
+        self.assertEqual(counts(CountersTest.user), (0, 1))
+        Follow.objects.create(user=other, author=CountersTest.author)
+        other.delete()
+        self.assertEqual(counts(CountersTest.author), (0, 0))
+        self.assertEqual(counts(CountersTest.user), (0, 0))
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет рассинхронизированные счётчики
+        и создаёт недостающие профили."""
+        post = Post.objects.create(text='Пост', author=CountersTest.author)
+        Comment.objects.create(
+            text='Комментарий', author=CountersTest.user, post=post)
+        Post.objects.update(comment_count=7)
+        Profile.objects.filter(user=CountersTest.author).delete()
+        call_command('recount', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=CountersTest.author).posts_count, 1)
+
+
+class CascadeDeletionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(title='Группа', slug=c.SLUG)
+
+    def deletion_queries(self, obj):
+        with CaptureQueriesContext(connection) as queries:
+            obj.delete()
+        return len(queries)
+
+    def test_post_deletion_does_not_grow_with_comments(self):
+        """Удаление поста не делает запросов на каждый его
+        комментарий."""
+        author = User.objects.create_user(username=c.USERNAME_IVANOV)
+        counts = []
+        for size in (2, 50):
+            post = Post.objects.create(text='Пост', author=author,
+                                       group=CascadeDeletionTest.group)
+            Comment.objects.bulk_create(
+                Comment(post=post, author=author, text=f'Комментарий {n}')
+                for n in range(size))
+            counts.append(self.deletion_queries(post))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_user_deletion_does_not_grow_with_posts(self):
+        """Удаление пользователя не делает запросов на каждый его
+        пост без картинки."""
+        counts = []
+        for size in (2, 10):
+            author = User.objects.create_user(username=f'author_{size}')
+            for number in range(size):
+                Post.objects.create(text=f'Пост {number}', author=author,
+                                    group=CascadeDeletionTest.group)
+            counts.append(self.deletion_queries(author))
+        self.assertEqual(counts[0], counts[1])
+
+
+class FollowTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+        cls.author = User.objects.create_user(username=c.USERNAME_PETROV)
+
+    def follow_statements(self, action):
+        with CaptureQueriesContext(connection) as queries:
+            result = action(FollowTest.user, FollowTest.author)
+        statements = [query['sql'] for query in queries
+                      if '"posts_follow"' in query['sql']]
+        return result, statements
+
+    def test_follow_is_idempotent(self):
+        """Подписка выполняется одним запросом к таблице подписок,
+        отписка удаляет найденную подписку, повторная подписка
+        и подписка на себя игнорируются."""
+        result, statements = self.follow_statements(follows.follow)
+        self.assertTrue(result)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT'))
+        self.assertFalse(
+            follows.follow(FollowTest.user, FollowTest.author))
+        self.assertFalse(follows.follow(FollowTest.user, FollowTest.user))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            Profile.objects.get(user=FollowTest.author).followers_count, 1)
+        result, statements = self.follow_statements(follows.unfollow)
+        self.assertTrue(result)
+        self.assertLessEqual(len(statements), 2)
+        self.assertTrue(statements[-1].startswith('DELETE'))
+        self.assertFalse(
+            follows.unfollow(FollowTest.user, FollowTest.author))
+        self.assertEqual(
+            Profile.objects.get(user=FollowTest.author).followers_count, 0)
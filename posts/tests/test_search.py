@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Group, Post
+
+from . import constants as c
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+        cls.group = Group.objects.create(title='Садоводы', slug=c.SLUG)
+        cls.tomatoes = Post.objects.create(
+            text='Томаты <b>дали</b> урожай, томаты и огурцы',
+            author=cls.user, group=cls.group)
+        cls.cucumbers = Post.objects.create(
+            text='Огурцы, рассада, томаты', author=cls.user)
+
+    def found(self, query):
+        return [post.pk for post in search.SearchResults(query)]
+
+    def test_ranks_and_highlights_matches(self):
+        """Поиск ранжирует записи и подсвечивает найденные слова,
+        экранируя остальной текст."""
+        response = self.client.get(reverse('search'), {'q': 'томаты'})
+        page = response.context['page']
+        self.assertEqual([post.pk for post in page],
+                         [self.tomatoes.pk, self.cucumbers.pk])
+        self.assertIn('<mark>Томаты</mark> &lt;b&gt;дали',
+                      page[0].snippet)
+        self.assertContains(response, '<mark>томаты</mark>')
+
+    def test_finds_by_prefix_author_and_group(self):
+        """Последнее слово ищется как префикс, находятся также
+        имя автора и название сообщества."""
+        self.assertEqual(self.found('расс'), [self.cucumbers.pk])
+        self.assertEqual(len(self.found(c.USERNAME_IVANOV.lower())), 2)
+        self.assertEqual(self.found('садоводы'), [self.tomatoes.pk])
+        self.assertEqual(self.found('?!'), [])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении записи
+        и при переименовании сообщества и автора."""
+        cucumbers = Post.objects.get(pk=self.cucumbers.pk)
+        cucumbers.text = 'Кабачки'
+        cucumbers.save()
+        self.assertEqual(self.found('огурцы'), [self.tomatoes.pk])
+        Group.objects.filter(pk=self.group.pk).update(title='Огородники')
+        self.assertEqual(self.found('огородники'), [self.tomatoes.pk])
+        User.objects.filter(pk=self.user.pk).update(username='Sidorov')
+        self.assertEqual(len(self.found('sidorov')), 2)
+        Post.objects.filter(pk=self.tomatoes.pk).delete()
+        self.assertEqual(self.found('томаты'), [])
+
+    @override_settings(SEARCH_MAX_RESULTS=1)
+    def test_ranks_only_newest_matches(self):
+        """Ранжируются только самые новые совпадения."""
+        self.assertEqual(self.found('томаты'), [self.cucumbers.pk])
+
+    def test_rebuild_refills_index(self):
+        """Команда перестраивает индекс по всем записям."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.found('томаты'), [])
+        call_command('rebuild_search', '--batch-size=1', stdout=StringIO())
+        self.assertEqual(set(self.found('томаты')),
+                         {self.tomatoes.pk, self.cucumbers.pk})
+
+    def test_rebuild_replaces_stale_rows(self):
+        """Перестроение заменяет устаревшие строки индекса
+        и удаляет строки несуществующих записей."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {search.TABLE} SET text = %s WHERE rowid = %s',
+                ['кабачки', self.tomatoes.pk])
+            cursor.execute(
+                f'INSERT INTO {search.TABLE} '
+                f'(rowid, text, author, group_title) VALUES (%s, %s, %s, %s)',
+                [self.cucumbers.pk + 5, 'томаты', '', ''])
+        self.assertEqual(search.rebuild(batch_size=2), 2)
+        self.assertEqual(set(self.found('томаты')),
+                         {self.tomatoes.pk, self.cucumbers.pk})
+        self.assertEqual(self.found('кабачки'), [])
@@ -0,0 +1,68 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, Timeline
+from tasks import worker
+
+from . import constants as c
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+        cls.author = User.objects.create_user(username=c.USERNAME_PETROV)
+        Post.objects.create(text='Старый пост', author=TimelineTests.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(TimelineTests.user)
+
+    def feed(self):
+        response = self.authorized_client.get(reverse('follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка переносит в ленту старые посты автора,
+        новые посты попадают в ленту при публикации,
+        а отписка убирает их из ленты."""
+        self.authorized_client.get(
+            reverse('profile_follow',
+                    kwargs={'username': c.USERNAME_PETROV}))
+        Post.objects.create(text='Новый пост', author=TimelineTests.author)
+        self.assertEqual(self.feed(), ['Новый пост', 'Старый пост'])
+        self.authorized_client.get(
+            reverse('profile_unfollow',
+                    kwargs={'username': c.USERNAME_PETROV}))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(
+            Timeline.objects.filter(user=TimelineTests.user).exists())
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты
+        по подпискам."""
+        Follow.objects.create(user=TimelineTests.user,
+                              author=TimelineTests.author)
+        Timeline.objects.filter(user=TimelineTests.user).delete()
+        self.assertEqual(self.feed(), [])
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), ['Старый пост'])
+
+    @override_settings(TIMELINE_INLINE_FAN_OUT=0)
+    def test_popular_author_posts_are_fanned_out_in_background(self):
+        """Пост автора с многими подписчиками попадает в ленты
+        фоновой задачей, а не во время запроса."""
+        self.authorized_client.get(
+            reverse('profile_follow',
+                    kwargs={'username': c.USERNAME_PETROV}))
+        Post.objects.create(text='Новый пост', author=TimelineTests.author)
+        self.assertEqual(self.feed(), ['Старый пост'])
+        worker.work(once=True)
+        self.assertEqual(self.feed(), ['Новый пост', 'Старый пост'])
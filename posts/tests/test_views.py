@@ -4,13 +4,19 @@ import tempfile
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post
+from posts import cards
+from posts.models import Comment, Follow, Group, Post
+from tasks import worker
 
 from . import constants as c
+from .utils import run_on_commit
 
 User = get_user_model()
 
@@ -102,7 +108,7 @@ class PostPagesTests(TestCase):
         self.assertEqual(post_text_0, 'Текст поста')
         self.assertEqual(post_author_0, PostPagesTests.user)
         self.assertEqual(post_group_0, PostPagesTests.group)
-        self.assertEqual(post_image_0.name, 'posts/test.gif')
+        self.assertEqual(post_image_0.name, c.TEST_GIF_NAME)
 
     def test_group_pages_show_correct_context(self):
         """Проверяет, что шаблон group сформирован
@@ -120,7 +126,7 @@ class PostPagesTests(TestCase):
         )
         self.assertEqual(
             response.context['page'][0].image.name,
-            'posts/test.gif'
+            c.TEST_GIF_NAME
         )
         self.assertEqual(
             response.context['group'].title,
@@ -190,7 +196,7 @@ class PostPagesTests(TestCase):
         )
         self.assertEqual(
             response.context['page'][0].image.name,
-            'posts/test.gif'
+            c.TEST_GIF_NAME
         )
 
     def test_username_post_id_correct_context(self):
@@ -215,9 +221,93 @@ class PostPagesTests(TestCase):
         )
         self.assertEqual(
             response.context['selected_post'].image.name,
-            'posts/test.gif'
+            c.TEST_GIF_NAME
         )
 
+    def test_post_page_queries(self):
+        """Проверяет, что страница поста с комментариями разных
+        авторов и состоянием подписки строится за постоянное
+        число запросов."""
+        post = Post.objects.create(
+            text='Пост без картинки',
+            author=PostPagesTests.another_user,
+            group=PostPagesTests.group
+        )
+        for author in (PostPagesTests.user, PostPagesTests.another_user) * 3:
+            Comment.objects.create(post=post, author=author, text='Ответ')
+        url = reverse('post', kwargs={'username': c.USERNAME_PETROV,
+                                      'post_id': post.pk})
+        # Сессия, пользователь, пост с автором и подпиской, комментарии.
+        with self.assertNumQueries(4):
+            response = self.authorized_client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertEqual(len(response.context['comments']), 6)
+        response = self.authorized_client.get(
+            reverse('post', kwargs={'username': c.USERNAME_IVANOV,
+                                    'post_id': post.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_comments_are_loaded_by_pages(self):
+        """Проверяет, что на странице поста выводится первая страница
+        комментариев, а остальные отдаёт адрес «показать ещё»."""
+        post = Post.objects.create(
+            text='Популярный пост',
+            author=PostPagesTests.another_user
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=PostPagesTests.user,
+                    text=f'Комментарий {number}')
+            for number in range(settings.COMMENTS_PAGINATE_BY + 5)
+        )
+        Post.objects.filter(pk=post.pk).update(
+            comment_count=settings.COMMENTS_PAGINATE_BY + 5)
+        response = self.authorized_client.get(
+            reverse('post', kwargs={'username': c.USERNAME_PETROV,
+                                    'post_id': post.pk}))
+        first_page = list(response.context['comments'])
+        self.assertEqual(len(first_page), settings.COMMENTS_PAGINATE_BY)
+        more_url = reverse('post_comments',
+                           kwargs={'username': c.USERNAME_PETROV,
+                                   'post_id': post.pk})
+        cursor = response.context['next_cursor']
+        self.assertContains(response, f'{more_url}?cursor={cursor}')
+        response = self.client.get(more_url, {'cursor': cursor})
+        second_page = list(response.context['comments'])
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(
+            first_page + second_page,
+            list(post.comments.order_by('-created', '-id'))
+        )
+        response = self.client.get(more_url,
+                                   {'cursor': cursor, 'format': 'json'})
+        self.assertEqual(
+            [comment['id'] for comment in response.json()['comments']],
+            [comment.id for comment in second_page]
+        )
+        response = self.client.get(more_url, {'cursor': 'не курсор'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_comments_do_not_depend_on_comment_counter(self):
+        """Проверяет, что ссылка «показать ещё» появляется,
+        даже если счётчик комментариев поста отстал."""
+        post = Post.objects.create(
+            text='Пост с отставшим счётчиком',
+            author=PostPagesTests.another_user
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=PostPagesTests.user,
+                    text=f'Комментарий {number}')
+            for number in range(settings.COMMENTS_PAGINATE_BY + 1)
+        )
+        Post.objects.filter(pk=post.pk).update(comment_count=0)
+        response = self.authorized_client.get(
+            reverse('post', kwargs={'username': c.USERNAME_PETROV,
+                                    'post_id': post.pk}))
+        self.assertEqual(len(response.context['comments']),
+                         settings.COMMENTS_PAGINATE_BY)
+        self.assertIsNotNone(response.context['next_cursor'])
+
     def test_count_posts_page(self):
         """Проверяет, что в словарь context
         главной страницы передаётся не более
@@ -232,18 +322,160 @@ class PostPagesTests(TestCase):
         self.assertEqual(
             len(response.context['page']), 10)
 
+    def test_cursor_pagination(self):
+        """Проверяет, что курсоры ведут на следующую и предыдущую
+        страницы ленты группы без пропусков и повторов."""
+        for number in range(25):
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=PostPagesTests.user,
+                group=PostPagesTests.group
+            )
+        url = reverse('group', kwargs={'slug': c.SLUG})
+        pages = [self.authorized_client.get(url).context['page']]
+        while pages[-1].has_next():
+            pages.append(self.authorized_client.get(
+                url, {'cursor': pages[-1].next_cursor}).context['page'])
+        self.assertEqual([page.number for page in pages], [1, 2, 3])
+        self.assertEqual(
+            [post for page in pages for post in page],
+            list(Post.objects.filter(
+                group=PostPagesTests.group).order_by('-pub_date', '-id'))
+        )
+        previous_page = self.authorized_client.get(
+            url, {'cursor': pages[2].previous_cursor}).context['page']
+        self.assertEqual(previous_page.number, 2)
+        self.assertEqual(list(previous_page), list(pages[1]))
+        self.assertIsNone(previous_page.previous_cursor)
+        response = self.authorized_client.get(
+            url, {'cursor': 'не курсор'})
+        self.assertEqual(response.context['page'].number, 1)
+
+    def test_feed_counts_are_cached(self):
+        """Проверяет, что размер ленты хранится в кеше, меняется
+        при публикации и удалении поста, а подсчёт ограничен."""
+        cache.clear()
+        url = reverse('group', kwargs={'slug': c.SLUG})
+        for number in range(3):
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=PostPagesTests.user,
+                group=PostPagesTests.group
+            )
+        run_on_commit()
+        count = self.authorized_client.get(url).context['page'].paginator.count
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        self.assertFalse(
+            [query for query in queries if 'COUNT' in query['sql']])
+        post = Post.objects.create(
+            text='Ещё пост',
+            author=PostPagesTests.user,
+            group=PostPagesTests.group
+        )
+        run_on_commit()
+        page = self.authorized_client.get(url).context['page']
+        self.assertEqual(page.paginator.count, count + 1)
+        post.delete()
+        run_on_commit()
+        page = self.authorized_client.get(url).context['page']
+        self.assertEqual(page.paginator.count, count)
+        cache.clear()
+        with override_settings(PAGINATOR_COUNT_LIMIT=2):
+            response = self.authorized_client.get(url)
+        self.assertTrue(response.context['page'].paginator.approximate)
+        self.assertEqual(response.context['page'].paginator.count, 3)
+
+    def test_feed_queries_do_not_grow_with_posts(self):
+        """Проверяет, что число запросов к базе на страницах лент
+        не зависит от количества постов на странице."""
+        urls = (
+            reverse('index'),
+            reverse('group', kwargs={'slug': c.SLUG}),
+            reverse('profile', kwargs={'username': c.USERNAME_PETROV}),
+            reverse('follow_index'),
+        )
+
+        def count_queries(url):
+            self.authorized_client.get(url)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.authorized_client.get(url)
+            return len(queries)
+
+        counts = [count_queries(url) for url in urls]
+        for number in range(9):
+            post = Post.objects.create(
+                text=f'Пост {number}',
+                author=PostPagesTests.another_user,
+                group=PostPagesTests.group
+            )
+            Comment.objects.create(post=post,
+                                   author=PostPagesTests.user,
+                                   text='Комментарий')
+        for url, count in zip(urls, counts):
+            with self.subTest(url=url):
+                self.assertEqual(count_queries(url), count)
+
+    def test_feed_thumbnails_are_resolved_in_one_batch(self):
+        """Проверяет, что миниатюры всех постов страницы ищутся
+        одним запросом к хранилищу sorl-thumbnail."""
+        for number in range(3):
+            Post.objects.create(
+                text=f'Пост с картинкой {number}',
+                author=PostPagesTests.user,
+                image=SimpleUploadedFile(
+                    name=f'feed{number}.gif',
+                    content=c.test_gif,
+                    content_type='image/gif'
+                )
+            )
+        worker.work(once=True)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, 'type="image/webp"',
+                            count=Post.objects.exclude(image='').count())
+        self.assertEqual(len([query for query in queries
+                              if 'thumbnail_kvstore' in query['sql']]), 1)
+
     def test_page_index_cache(self):
-        """Проверяет, что на главной странице
-        работает Cache"""
-        content_one_post = self.authorized_client.get(reverse('index')).content
+        """Проверяет, что на главной странице карточки постов
+        берутся из кэша, а новые посты и комментарии
+        появляются сразу."""
+        self.authorized_client.get(reverse('index'))
+        post = Post.objects.get(pk=self.post_id)
+        cache.set(cards._card_key(post, 'author'), 'Карточка из кэша')
+        content = self.authorized_client.get(reverse('index')).content
+        self.assertIn('Карточка из кэша'.encode(), content)
         Post.objects.create(
             text='Текст второго поста',
             author=PostPagesTests.user,
             group=PostPagesTests.group,
             image=PostPagesTests.image
         )
-        content_two_post = self.authorized_client.get(reverse('index')).content
-        self.assertEqual(content_one_post, content_two_post)
+        Comment.objects.create(post=post, author=PostPagesTests.user,
+                               text='Комментарий')
+        content = self.authorized_client.get(reverse('index')).content
+        self.assertIn('Текст второго поста'.encode(), content)
+        self.assertIn('Комментариев: 1'.encode(), content)
+        self.assertNotIn('Карточка из кэша'.encode(), content)
+
+    def test_cards_show_renamed_group_and_author(self):
+        """Проверяет, что после переименования группы и автора
+        карточки постов показывают новые название и ссылки."""
+        self.authorized_client.get(reverse('index'))
+        group = Group.objects.get(pk=PostPagesTests.group.pk)
+        group.title = 'Новое название группы'
+        group.slug = 'new-slug'
+        group.save()
+        user = User.objects.get(pk=PostPagesTests.user.pk)
+        user.username = 'renamed'
+        user.save()
+        content = self.authorized_client.get(reverse('index')).content
+        self.assertIn('Новое название группы'.encode(), content)
+        self.assertIn(reverse('group', args=['new-slug']).encode(), content)
+        self.assertIn(reverse('profile', args=['renamed']).encode(), content)
 
     def test_profile_follow(self):
         """Проверяет, что Авторизованный пользователь
@@ -284,3 +516,62 @@ class PostPagesTests(TestCase):
             reverse('follow_index'))
         self.assertEqual(
             len(response.context['page']), 0)
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=c.USERNAME_IVANOV)
+        cls.group = Group.objects.create(
+            title='Тестовое название сообщества',
+            slug=c.SLUG,
+            description='Тестовое описание сообщества'
+        )
+        cls.other_group = Group.objects.create(
+            title='Пустая группа',
+            slug=c.SLUG_EMPTY_GROUP,
+            description='Описание пустой группы'
+        )
+        cls.post = Post.objects.create(text='Текст поста',
+                                       author=cls.user,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': c.SLUG}),
+            'profile': reverse('profile',
+                               kwargs={'username': c.USERNAME_IVANOV}),
+        }
+
+    def contents(self):
+        return {name: self.guest_client.get(url).content.decode()
+                for name, url in self.urls.items()}
+
+    def test_pages_are_cached_until_their_feed_changes(self):
+        """Страницы лент для анонимов отдаются из кэша, пока
+        не изменится их лента и изменение не зафиксировано, и только
+        затронутые ленты сбрасываются."""
+        self.contents()
+        Post.objects.filter(pk=AnonymousPageCacheTests.post.pk).update(
+            text='Изменено в обход сигналов')
+        for name, content in self.contents().items():
+            with self.subTest(page=name):
+                self.assertIn('Текст поста', content)
+        Post.objects.create(text='Пост другой группы',
+                            author=AnonymousPageCacheTests.user,
+                            group=AnonymousPageCacheTests.other_group)
+        self.assertNotIn('Пост другой группы', self.contents()['index'])
+        run_on_commit()
+        contents = self.contents()
+        self.assertIn('Пост другой группы', contents['index'])
+        self.assertIn('Пост другой группы', contents['profile'])
+        self.assertIn('Текст поста', contents['group'])
+        self.assertNotIn('Пост другой группы', contents['group'])
+        authorized_client = Client()
+        authorized_client.force_login(AnonymousPageCacheTests.user)
+        content = authorized_client.get(self.urls['group']).content.decode()
+        self.assertIn('Изменено в обход сигналов', content)
@@ -0,0 +1,9 @@
+from django.db import connection
+
+
+def run_on_commit():
+    """Runs the callbacks TestCase keeps waiting for a commit that
+    never comes."""
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for _, callback in callbacks:
+        callback()
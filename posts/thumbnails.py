@@ -0,0 +1,141 @@
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
+from django.utils import timezone
+from PIL import Image, ImageOps
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.engines import pil_engine
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from . import page_cache
+from .models import Post
+
+
+class Engine(pil_engine.Engine):
+    """The Pillow engine of sorl-thumbnail that flattens transparent
+    palette images onto white for JPEG instead of failing to write
+    them as RGBA."""
+
+    def _colorspace(self, image, colorspace, format):
+        image = super()._colorspace(image, colorspace, format)
+        if format == 'JPEG' and image.mode == 'RGBA':
+            flat = Image.new('RGB', image.size, 'white')
+            flat.paste(image, mask=image.getchannel('A'))
+            return flat
+        return image
+
+
+def _thumbnail_file(image, geometry, options):
+    """Returns the file sorl-thumbnail names the thumbnail by,
+    normalizing the options the way ThumbnailBackend.get_thumbnail
+    does before it hashes them."""
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage)
+
+
+def card_variants():
+    """Yields the format (None for the default one), the width, the
+    geometry and the options of every variant of the card image."""
+    card_width, card_height = settings.POST_CARD_SIZE
+    for image_format in (None, *settings.POST_CARD_FORMATS):
+        for width in settings.POST_CARD_WIDTHS:
+            options = {'crop': 'center', 'upscale': True}
+            if image_format is not None:
+                options['format'] = image_format
+            height = round(width * card_height / card_width)
+            yield image_format, width, f'{width}x{height}', options
+
+
+def _get_many(keys):
+    """Reads raw values of sorl-thumbnail's key-value store with one
+    cache fetch and one query for the misses, caching them, misses
+    included, the way the cached_db store does key by key."""
+    kvstore, empty = default.kvstore, cached_db_kvstore.EMPTY_VALUE
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        values = {key: kvstore._get_raw(key) for key in keys}
+        return {key: value for key, value in values.items() if value}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        fetched = {key: found.get(key, empty) for key in missing}
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {key: value for key, value in values.items()
+            if value != empty}
+
+
+def attach_pictures(posts):
+    """Resolves the ready card variants of all the posts at once and
+    attaches them as post.picture_sources, {format: [(width,
+    thumbnail), ...]}, so that rendering does no thumbnail I/O."""
+    wanted = {}
+    for post in posts:
+        post.picture_sources = {}
+        if not post.image:
+            continue
+        for image_format, width, geometry, options in card_variants():
+            key = add_prefix(
+                _thumbnail_file(post.image, geometry, options).key, 'image')
+            wanted.setdefault(key, []).append((post, image_format, width))
+    values = _get_many(list(wanted))
+    for key, targets in wanted.items():
+        if key not in values:
+            continue
+        thumbnail = deserialize_image_file(values[key])
+        for post, image_format, width in targets:
+            post.picture_sources.setdefault(image_format, []).append(
+                (width, thumbnail))
+
+
+def placeholder(image):
+    """Returns a blurry data URI of the card crop a few pixels wide,
+    shown inline while the real image loads."""
+    width, height = settings.POST_CARD_PLACEHOLDER_SIZE
+    image.open()
+    try:
+        with Image.open(image) as source:
+            source.draft('RGB', (width * 8, height * 8))
+            tiny = ImageOps.fit(source.convert('RGB'), (width, height))
+    finally:
+        image.close()
+    data = BytesIO()
+    tiny.save(data, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        data.getvalue()).decode()
+
+
+def generate(post):
+    """Makes every variant of the card image and its placeholder and
+    stores the size of the image, then lets the cached cards and
+    pages of the post go."""
+    for _, _, geometry, options in card_variants():
+        get_thumbnail(post.image, geometry, **options)
+    width, height = post.image_width, post.image_height
+    if not width or not height:
+        width, height = get_image_dimensions(post.image)
+    Post.objects.filter(pk=post.pk).update(
+        image_width=width, image_height=height,
+        image_placeholder=placeholder(post.image), updated=timezone.now())
+    page_cache.bump_post_feeds(post.author.username,
+                               post.group and post.group.slug)
@@ -0,0 +1,69 @@
+from django.db.models import F
+
+from .models import Follow, Post, Timeline
+
+BATCH_SIZE = 500
+
+TIMELINE_KEYS = ('-timeline_date', '-timeline_post')
+
+
+def _insert(entries, batch_size=BATCH_SIZE):
+    """Writes timeline entries in batches, skipping the ones
+    that are already there."""
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Copies a new post to the timelines of its author's followers."""
+    followers = Follow.objects.filter(
+        author=post.author_id).values_list('user', flat=True)
+    _insert(Timeline(user_id=user_id, post_id=post.pk,
+                     pub_date=post.pub_date)
+            for user_id in followers.iterator())
+
+
+def fan_out_posts(author, posts):
+    """Copies new posts of the author to the timelines of the
+    author's followers, reading the followers once."""
+    followers = list(Follow.objects.filter(
+        author=author).values_list('user', flat=True))
+    _insert(Timeline(user_id=user_id, post_id=post.pk,
+                     pub_date=post.pub_date)
+            for post in posts for user_id in followers)
+
+
+def backfill(user_id, author_id):
+    """Copies all posts of the author to the user's timeline."""
+    posts = Post.objects.filter(
+        author=author_id).values_list('pk', 'pub_date')
+    _insert(Timeline(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator())
+
+
+def prune(user_id, author_id):
+    """Removes the posts of the author from the user's timeline."""
+    Timeline.objects.filter(user=user_id, post__author=author_id).delete()
+
+
+def rebuild(user):
+    """Refills the user's timeline from their subscriptions."""
+    Timeline.objects.filter(user=user).delete()
+    for author_id in Follow.objects.filter(
+            user=user).values_list('author', flat=True):
+        backfill(user.pk, author_id)
+
+
+def timeline_posts(user):
+    """Returns the user's follow feed read from the timeline table;
+    paginate it by TIMELINE_KEYS to stay on the timeline index."""
+    return Post.objects.for_feed().filter(timelines__user=user).annotate(
+        timeline_date=F('timelines__pub_date'),
+        timeline_post=F('timelines__post'),
+    )
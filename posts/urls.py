@@ -1,8 +1,18 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
+    path('api/posts/', api.index_feed, name='api_index'),
+    path('api/posts/batch/', api.posts_batch, name='api_posts_batch'),
+    path('api/comments/batch/', api.comments_batch,
+         name='api_comments_batch'),
+    path('api/follow/posts/', api.follow_feed, name='api_follow_index'),
+    path('api/groups/<slug:slug>/posts/', api.group_feed, name='api_group'),
+    path('api/users/<str:username>/posts/', api.author_feed,
+         name='api_profile'),
+    path('api/users/<str:username>/posts/<int:post_id>/', api.post_detail,
+         name='api_post'),
     path('follow/', views.follow_index, name='follow_index'),
     path('<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
@@ -10,9 +20,15 @@ urlpatterns = [
          name='profile_unfollow'),
     path('<username>/<int:post_id>/comment', views.add_comment,
          name='add_comment'),
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('group/<slug:slug>/', views.group_posts, name='group'),
     path('', views.index, name='index'),
     path('new/', views.new_post, name='new_post'),
+    # Two segments deep, so that they do not hide the profiles
+    # of users named "search".
+    path('search/posts/', views.search_posts, name='search'),
+    path('search/pages/', views.autocomplete_pages, name='autocomplete'),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path('<str:username>/<int:post_id>/edit/',
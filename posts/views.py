@@ -1,35 +1,92 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.paginator import InvalidPage
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
-from yatube.settings import PAGINATE_BY
+from yatube.settings import (AUTOCOMPLETE_LIMIT, COMMENTS_PAGINATE_BY,
+                             PAGINATE_BY)
 
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
+from .models import Follow, Group, Post
+from . import autocomplete, cards, feeds, follows, page_cache, search
+from .paginators import CachedCountPaginator, KeysetPaginator
 
 User = get_user_model()
 
+COMMENT_KEYS = ('-created', '-id')
 
+
+def _comments_paginator(post):
+    return KeysetPaginator(post.comments.select_related('author'),
+                           COMMENTS_PAGINATE_BY, keys=COMMENT_KEYS)
+
+
+def _first_comments(post):
+    """Returns the first page of the post's comments as a QuerySet
+    and the cursor of the next page, if the post has more comments."""
+    paginator = _comments_paginator(post)
+    page = paginator.page(None)
+    # Templates and callers expect a QuerySet; it is given the rows
+    # the paginator has read, as prefetch_related() does, instead of
+    # reading them again.
+    comments = paginator.object_list.filter(
+        pk__in=[comment.pk for comment in page])
+    comments._result_cache = page.object_list
+    return comments, page.next_cursor
+
+
+@page_cache.cache_anonymous_page(page_cache.index_feed)
 def index(request):
     """This function displays the main page with posts."""
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, PAGINATE_BY)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    paginator = KeysetPaginator(
+        post_list, PAGINATE_BY,
+        count_key=feeds.count_key(page_cache.index_feed()))
+    cursor = request.GET.get('cursor')
+    page = paginator.get_page(cursor)
+    cards.attach_cards(page, request.user)
     return render(request, 'index.html', {'page': page})
 
 
+@page_cache.cache_anonymous_page(page_cache.group_feed)
 def group_posts(request, slug):
     """This function displays the community page with posts."""
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
-    paginator = Paginator(posts, PAGINATE_BY)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = Post.objects.for_feed().filter(group=group)
+    paginator = KeysetPaginator(
+        posts, PAGINATE_BY,
+        count_key=feeds.count_key(page_cache.group_feed(slug)))
+    cursor = request.GET.get('cursor')
+    page = paginator.get_page(cursor)
+    cards.attach_cards(page, request.user)
     return render(request, 'group.html', {'group': group, 'page': page})
 
 
+def search_posts(request):
+    """Displays the posts matching the query, the most relevant first."""
+    query = request.GET.get('q', '').strip()
+    paginator = CachedCountPaginator(search.SearchResults(query),
+                                     PAGINATE_BY)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request, 'search.html',
+                  {'query': query, 'page': page,
+                   'window': paginator.page_window(page.number)})
+
+
+def autocomplete_pages(request):
+    """Returns the authors and groups whose names start with ?q=,
+    as JSON, at most ?limit= of them."""
+    try:
+        limit = int(request.GET.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    limit = max(1, min(limit, AUTOCOMPLETE_LIMIT))
+    return JsonResponse({'results': autocomplete.suggest(
+        request.GET.get('q', ''), limit)})
+
+
 @login_required
 def new_post(request):
     """This function displays a page with a form to add a new post."""
@@ -37,19 +94,24 @@ def new_post(request):
     if form and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('index')
     return render(request, 'new.html', {'form': form})
 
 
+@page_cache.cache_anonymous_page(page_cache.author_feed)
 def profile(request, username):
     """This function displays the user's profile page."""
-    selected_user = get_object_or_404(User, username=username)
+    selected_user = get_object_or_404(User.objects.select_related('profile'),
+                                      username=username)
     current_user = request.user
-    posts = Post.objects.filter(author=selected_user)
-    paginator = Paginator(posts, PAGINATE_BY)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = Post.objects.for_feed().filter(author=selected_user)
+    paginator = KeysetPaginator(
+        posts, PAGINATE_BY,
+        count_key=feeds.count_key(page_cache.author_feed(username)))
+    cursor = request.GET.get('cursor')
+    page = paginator.get_page(cursor)
     following = False
     if current_user.is_authenticated:
         if Follow.objects.filter(user=current_user,
@@ -57,6 +119,7 @@ def profile(request, username):
             following = True
         else:
             following = False
+    cards.attach_cards(page, current_user)
     return render(request, 'profile.html',
                   {'page': page,
                    'selected_user': selected_user,
@@ -68,17 +131,11 @@ def profile(request, username):
 
 def post_view(request, username, post_id):
     """This function displays the user's post page."""
-    selected_user = get_object_or_404(User, username=username)
     current_user = request.user
-    selected_post = get_object_or_404(Post, author=selected_user, pk=post_id)
-    comments = Comment.objects.filter(post=selected_post)
-    following = False
-    if current_user.is_authenticated:
-        if Follow.objects.filter(user=current_user,
-                                 author=selected_user):
-            following = True
-        else:
-            following = False
+    selected_post = get_object_or_404(Post.objects.for_detail(current_user),
+                                      author__username=username, pk=post_id)
+    selected_user = selected_post.author
+    comments, next_cursor = _first_comments(selected_post)
     form = CommentForm(request.POST or None)
     if form and form.is_valid():
         comment = form.save(commit=False)
@@ -94,8 +151,9 @@ def post_view(request, username, post_id):
                    'current_user': current_user,
                    'selected_post': selected_post,
                    'comments': comments,
+                   'next_cursor': next_cursor,
                    'form': form,
-                   'following': following
+                   'following': selected_post.following
                    }
                   )
 
@@ -118,7 +176,8 @@ def post_edit(request, username, post_id):
                     )
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             return redirect('post',
                             username=selected_user.username,
                             post_id=post_id)
@@ -150,7 +209,7 @@ def add_comment(request, username, post_id):
     """Adds a comment to the database."""
     selected_user = get_object_or_404(User, username=username)
     selected_post = get_object_or_404(Post, author=selected_user, pk=post_id)
-    comments = Comment.objects.filter(post=selected_post)
+    comments, next_cursor = _first_comments(selected_post)
     form = CommentForm(request.POST or None)
     if form and form.is_valid():
         comment = form.save(commit=False)
@@ -162,21 +221,49 @@ def add_comment(request, username, post_id):
                         post_id=selected_post.id
                         )
     return render(request, 'include/comments.html',
-                  {'comments': comments,
+                  {'selected_user': selected_user,
+                   'selected_post': selected_post,
+                   'comments': comments,
+                   'next_cursor': next_cursor,
                    'form': form})
 
 
+def post_comments(request, username, post_id):
+    """Returns the next page of the post's comments as an HTML
+    fragment, or as JSON with ?format=json."""
+    selected_post = get_object_or_404(Post.objects.select_related('author'),
+                                      author__username=username, pk=post_id)
+    paginator = _comments_paginator(selected_post)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidPage:
+        raise Http404('Нет такой страницы комментариев')
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {'id': comment.id,
+                 'author': comment.author.username,
+                 'text': comment.text,
+                 'created': comment.created}
+                for comment in page
+            ],
+            'next_cursor': page.next_cursor,
+        })
+    return render(request, 'include/comment_list.html',
+                  {'selected_user': selected_post.author,
+                   'selected_post': selected_post,
+                   'comments': page,
+                   'next_cursor': page.next_cursor})
+
+
 @login_required
 def follow_index(request):
     """Displays the page following users."""
     current_user = request.user
-    following_users = Follow.objects.filter(
-        user=current_user).values_list(
-        'author', flat=True)
-    post_list = Post.objects.filter(author__in=following_users)
-    paginator = Paginator(post_list, PAGINATE_BY)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = feeds.follow_feed_paginator(current_user, PAGINATE_BY)
+    cursor = request.GET.get('cursor')
+    page = paginator.get_page(cursor)
+    cards.attach_cards(page, request.user)
     return render(request, 'follow.html', {'page': page})
 
 
@@ -185,13 +272,7 @@ def profile_follow(request, username):
     """Subscribes the current user
     to updates of the selected user."""
     selected_user = User.objects.get(username=username)
-    current_user = request.user
-    subscription = Follow.objects.filter(user=current_user,
-                                         author=selected_user)
-    if (selected_user != current_user
-            and (not subscription)):
-        Follow.objects.create(user=current_user,
-                              author=selected_user)
+    follows.follow(request.user, selected_user)
     return redirect('profile',
                     username=username)
 
@@ -201,11 +282,6 @@ def profile_unfollow(request, username):
     """Unsubscribes the current user
     to the updates of the selected user."""
     selected_user = User.objects.get(username=username)
-    current_user = request.user
-    subscription = Follow.objects.filter(user=current_user,
-                                         author=selected_user)
-    if selected_user != current_user and subscription:
-        Follow.objects.filter(user=request.user,
-                              author=selected_user).delete()
+    follows.unfollow(request.user, selected_user)
     return redirect('profile',
                     username=username)
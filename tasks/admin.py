@@ -0,0 +1,19 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at')
+    search_fields = ('name',)
+    list_filter = ('status',)
+    readonly_fields = ('attempts', 'locked_until', 'last_error', 'created')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        retried = queryset.filter(status=Task.DEAD).update(
+            status=Task.QUEUED, attempts=0, run_at=timezone.now())
+        self.message_user(request, f'Задач снова в очереди: {retried}')
+    retry.short_description = 'Повторить невыполненные задачи'
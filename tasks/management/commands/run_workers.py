@@ -0,0 +1,57 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tasks import worker
+
+
+class Command(BaseCommand):
+    help = 'Runs a pool of workers that execute the queued tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.TASKS_WORKERS,
+            help='Number of workers in the pool.')
+        parser.add_argument(
+            '--mode', choices=('thread', 'process'), default='thread',
+            help='Run the workers as threads or as processes.')
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Seconds an idle worker waits before looking again.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no task is due instead of waiting for more.')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'process':
+            # Forked workers must not share the parent's connection.
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            pool = [context.Process(target=worker.work,
+                                    args=(stop, options['once'],
+                                          options['poll']))
+                    for _ in range(options['workers'])]
+        else:
+            stop = threading.Event()
+            pool = [threading.Thread(target=worker.work,
+                                     args=(stop, options['once'],
+                                           options['poll']))
+                    for _ in range(options['workers'])]
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        for member in pool:
+            member.start()
+        self.stdout.write(
+            f'Started {len(pool)} {options["mode"]} workers.')
+        try:
+            for member in pool:
+                member.join()
+        except KeyboardInterrupt:
+            stop.set()
+            for member in pool:
+                member.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
@@ -0,0 +1,50 @@
+import json
+
+from django.conf import settings
+
+_tasks = {}
+
+
+class TaskFunction:
+    """A function that can be called in place or queued for a worker."""
+
+    def __init__(self, func, max_attempts=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts or settings.TASKS_MAX_ATTEMPTS
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        """Queues a call with JSON-serializable arguments.
+
+        The task is written through the default connection, so inside
+        transaction.atomic() it commits or rolls back together with
+        the rows written by the caller."""
+        from .models import Task
+        return Task.objects.create(
+            name=self.name,
+            payload=json.dumps({'args': args, 'kwargs': kwargs}),
+            max_attempts=self.max_attempts,
+        )
+
+
+def task(func=None, *, max_attempts=None):
+    """Registers a task function; use as @task or
+    @task(max_attempts=...)."""
+    def register(func):
+        registered = TaskFunction(func, max_attempts)
+        _tasks[registered.name] = registered
+        return registered
+    if func is not None:
+        return register(func)
+    return register
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise LookupError(f'Task {name!r} is not registered') from None
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.db import OperationalError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import worker
+from .models import Task
+from .registry import task
+
+calls = []
+
+
+@task
+def remember(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError('Не получилось')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_commits_with_the_transaction(self):
+        """Задача попадает в очередь только вместе с транзакцией,
+        в которой её поставили, и выполняется один раз."""
+        try:
+            with transaction.atomic():
+                remember.enqueue('откат')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with transaction.atomic():
+            remember.enqueue('запись')
+        self.assertEqual(worker.work(once=True), 1)
+        self.assertEqual(calls, ['запись'])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASKS_RETRY_DELAY=10)
+    def test_failed_task_is_retried_then_dead_lettered(self):
+        """Упавшая задача откладывается с нарастающей задержкой,
+        а после последней попытки остаётся в очереди мёртвой."""
+        explode.enqueue()
+        self.assertEqual(worker.work(once=True), 1)
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.QUEUED)
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn('Не получилось', failed.last_error)
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertEqual(worker.work(once=True), 0)
+        Task.objects.update(run_at=timezone.now())
+        self.assertEqual(worker.work(once=True), 1)
+        dead = Task.objects.get()
+        self.assertEqual(dead.status, Task.DEAD)
+        self.assertEqual(dead.attempts, 2)
+        self.assertEqual(worker.work(once=True), 0)
+
+    def test_task_of_dead_worker_is_taken_over(self):
+        """Задачу, захваченную упавшим воркером, забирает другой
+        после окончания аренды."""
+        remember.enqueue('снова')
+        worker.claim()
+        self.assertIsNone(worker.claim())
+        Task.objects.update(locked_until=timezone.now())
+        self.assertEqual(worker.work(once=True), 1)
+        self.assertEqual(calls, ['снова'])
+
+    def test_worker_that_lost_its_claim_keeps_the_task(self):
+        """Воркер, у которого истекла аренда, не удаляет задачу,
+        которую уже забрал другой."""
+        remember.enqueue('дважды')
+        late = worker.claim()
+        Task.objects.update(locked_until=timezone.now())
+        current = worker.claim()
+        self.assertTrue(worker.execute(late))
+        self.assertTrue(Task.objects.filter(pk=current.pk).exists())
+        self.assertTrue(worker.execute(current))
+        self.assertFalse(Task.objects.exists())
+
+    def test_task_that_kills_its_workers_is_dead_lettered(self):
+        """Задача, на которой воркер упал при последней попытке,
+        становится мёртвой, а не захватывается снова."""
+        explode.enqueue()
+        for _ in range(2):
+            worker.claim()
+            Task.objects.update(locked_until=timezone.now())
+        self.assertIsNone(worker.claim())
+        dead = Task.objects.get()
+        self.assertEqual(dead.status, Task.DEAD)
+        self.assertEqual(dead.last_error, worker.LOST_ERROR)
+
+    def test_worker_survives_locked_database(self):
+        """Воркер переживает занятую базу и продолжает работу."""
+        remember.enqueue('после блокировки')
+        claim = worker.claim
+        with mock.patch.object(worker, 'claim', side_effect=[
+                OperationalError('database is locked'), claim(), None]):
+            with self.assertLogs(worker.logger, 'ERROR'):
+                self.assertEqual(worker.work(once=True, poll=0), 1)
+        self.assertEqual(calls, ['после блокировки'])
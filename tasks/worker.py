@@ -0,0 +1,130 @@
+import datetime as dt
+import logging
+import random
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+CLAIM_CANDIDATES = 10
+
+LOST_ERROR = 'The worker was lost before the task finished.'
+
+
+def claim():
+    """Takes the next due task, or one whose worker has died, for
+    the current worker; returns None when nothing is due.
+
+    SQLite has no SELECT ... FOR UPDATE SKIP LOCKED, so the attempts
+    counter serves as the version of the row: only one of the workers
+    racing for a task manages to bump it.
+
+    A task whose worker died on its last attempt is moved to the dead
+    letters instead, so a task that kills its worker is not retried
+    forever."""
+    now = timezone.now()
+    buried = Task.objects.filter(
+        status=Task.RUNNING, locked_until__lt=now,
+        attempts__gte=F('max_attempts')).update(
+        status=Task.DEAD, locked_until=None, last_error=LOST_ERROR)
+    if buried:
+        logger.error('%s tasks are dead: their workers were lost '
+                     'on the last attempt.', buried)
+    due = Task.objects.filter(
+        Q(status=Task.QUEUED, run_at__lte=now)
+        | Q(status=Task.RUNNING, locked_until__lt=now)
+    ).order_by('run_at', 'id').values_list('pk', 'attempts')
+    lease = dt.timedelta(seconds=settings.TASKS_LEASE)
+    for pk, attempts in due[:CLAIM_CANDIDATES]:
+        claimed = Task.objects.filter(pk=pk, attempts=attempts).exclude(
+            status=Task.DEAD).update(
+            status=Task.RUNNING, attempts=F('attempts') + 1,
+            locked_until=now + lease)
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def backoff(attempts):
+    """Returns the delay before the next attempt: exponential
+    with jitter, capped at TASKS_RETRY_MAX_DELAY seconds."""
+    delay = min(settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.TASKS_RETRY_MAX_DELAY)
+    return dt.timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def _claimed(task):
+    """Returns the task's row while the claim of this worker holds:
+    once the lease runs out, another worker may have taken it."""
+    return Task.objects.filter(pk=task.pk, attempts=task.attempts)
+
+
+def execute(task):
+    """Runs a claimed task outside any transaction, so that slow work
+    does not hold the database write lock, then removes it.
+
+    A task whose worker dies or outlives the lease runs again, so
+    tasks must be safe to repeat; a worker that has lost its claim
+    leaves the task to the worker holding it."""
+    try:
+        args, kwargs = task.arguments
+        get_task(task.name)(*args, **kwargs)
+    except Exception:
+        fail(task, traceback.format_exc())
+        return False
+    _claimed(task).delete()
+    return True
+
+
+def fail(task, error):
+    """Schedules a retry of the task or moves it to the dead letters."""
+    if task.attempts >= task.max_attempts:
+        logger.error('Task %s is dead after %s attempts:\n%s',
+                     task, task.attempts, error)
+        _claimed(task).update(
+            status=Task.DEAD, locked_until=None, last_error=error)
+    else:
+        logger.warning('Task %s failed, attempt %s of %s:\n%s',
+                       task, task.attempts, task.max_attempts, error)
+        _claimed(task).update(
+            status=Task.QUEUED, locked_until=None, last_error=error,
+            run_at=timezone.now() + backoff(task.attempts))
+
+
+def work(stop=None, once=False, poll=1.0):
+    """Runs due tasks until `stop` is set or, with `once`, until
+    none is due; returns the number of tasks run.
+
+    A busy database ("database is locked") does not stop the worker:
+    it waits for `poll` seconds and tries again, and a task it could
+    not settle runs again once its lease runs out."""
+    stop = stop or threading.Event()
+    done = 0
+    try:
+        while not stop.is_set():
+            try:
+                task = claim()
+                if task is not None:
+                    execute(task)
+            except OperationalError:
+                logger.exception('The task queue is unavailable.')
+                stop.wait(poll)
+                continue
+            if task is None:
+                if once:
+                    break
+                stop.wait(poll)
+                continue
+            done += 1
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+    return done
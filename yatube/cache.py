@@ -0,0 +1,326 @@
+"""Two-tier cache backend shared by all worker processes of a host.
+
+Values live in a SQLite file (L2) that every process opens, and each
+process keeps the recently read ones in an in-memory LRU (L1). Every
+write or delete stores a fresh random stamp for the key in a small
+memory-mapped file; an L1 entry is only served while the stamp it was
+read under is still current, so a write in one worker is seen by the
+others on their very next read without any external service.
+
+Writers take a lock on the stamps file for the whole transaction and
+store the stamps right after COMMIT, so the stamps change in the order
+the writes commit and never before a reader can see the new value.
+"""
+import fcntl
+import mmap
+import os
+import pickle
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STAMP = struct.Struct('Q')
+
+# Process-wide state shared by the per-thread backend instances,
+# keyed by the location of the cache.
+_l1_stores = {}
+_stamp_maps = {}
+_stamp_files = {}
+_locks = {}
+_write_locks = {}
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._stamp_slots = int(options.get('STAMP_SLOTS', 65536))
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._lock = _locks.setdefault(location, threading.RLock())
+        self._write_lock = _write_locks.setdefault(location, threading.Lock())
+        self._l1 = _l1_stores.setdefault(location, OrderedDict())
+        self._local = threading.local()
+        self._writes = 0
+
+    # Storage
+
+    def _connection(self):
+        """Returns the SQLite connection of the current thread,
+        reopening it in a forked worker."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=10,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL'
+                ') WITHOUT ROWID')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS cache_entries_expires '
+                'ON cache_entries (expires)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Runs a write transaction and publishes the changes recorded
+        in it with _changed() once it commits.
+
+        The lock on the stamps file, taken by one thread of a process
+        at a time, keeps the other writers from committing before the
+        stamps are stored."""
+        conn = self._connection()
+        self._stamps()
+        stamps_file = _stamp_files[self._path]
+        with self._write_lock:
+            fcntl.lockf(stamps_file, fcntl.LOCK_EX)
+            try:
+                self._local.changes = []
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+                for change in self._local.changes:
+                    self._publish(*change)
+            finally:
+                self._local.changes = None
+                fcntl.lockf(stamps_file, fcntl.LOCK_UN)
+
+    def _stamps(self):
+        """Returns the memory map of stamps; slot 0 holds the epoch
+        changed by clear(), the others the stamps of the keys."""
+        stamps = _stamp_maps.get(self._path)
+        if stamps is None:
+            with self._lock:
+                stamps = _stamp_maps.get(self._path)
+                if stamps is None:
+                    size = STAMP.size * self._stamp_slots
+                    directory = os.path.dirname(self._path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    # Kept open: closing any descriptor of the file
+                    # would release the lock taken on it by writers.
+                    fd = os.open(f'{self._path}.stamps',
+                                 os.O_RDWR | os.O_CREAT, 0o600)
+                    if os.fstat(fd).st_size < size:
+                        os.ftruncate(fd, size)
+                    stamps = mmap.mmap(fd, size)
+                    _stamp_files[self._path] = fd
+                    _stamp_maps[self._path] = stamps
+        return stamps
+
+    def _slot(self, key):
+        return 1 + zlib.crc32(key.encode()) % (self._stamp_slots - 1)
+
+    def _stamp(self, key):
+        stamps = self._stamps()
+        return (STAMP.unpack_from(stamps, 0)[0],
+                STAMP.unpack_from(stamps, STAMP.size * self._slot(key))[0])
+
+    def _new_stamp(self, key=None):
+        """Stores a fresh stamp for the key, or a new epoch,
+        and returns the stamp of the key."""
+        slot = 0 if key is None else self._slot(key)
+        STAMP.pack_into(self._stamps(), STAMP.size * slot,
+                        secrets.randbits(64))
+        return None if key is None else self._stamp(key)
+
+    # L1
+
+    def _remember(self, key, stamp, pickled, expires):
+        with self._lock:
+            self._l1[key] = (stamp, pickled, expires)
+            self._l1.move_to_end(key, last=False)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem()
+
+    def _recall(self, key):
+        """Returns the pickled value from L1 if it is still current."""
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            stamp, pickled, expires = entry
+            if ((expires is not None and expires <= time.time())
+                    or stamp != self._stamp(key)):
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key, last=False)
+            return pickled
+
+    def _forget(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _changed(self, key, pickled=None, expires=None):
+        """Records a write or a delete of the key, or a clear() without
+        a key, to publish once the transaction commits."""
+        self._local.changes.append((key, pickled, expires))
+
+    def _publish(self, key, pickled, expires):
+        """Publishes a committed change to all workers; the writers
+        still wait, so the new stamp is current and the value is the
+        one stored under it."""
+        with self._lock:
+            stamp = self._new_stamp(key)
+            if key is None:
+                self._l1.clear()
+            elif pickled is None:
+                self._forget(key)
+            else:
+                self._remember(key, stamp, pickled, expires)
+
+    # Cache API
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found, missing = {}, {}
+        for key, original in keys.items():
+            pickled = self._recall(key)
+            if pickled is None:
+                missing[key] = self._stamp(key)
+            else:
+                found[original] = pickle.loads(pickled)
+        if missing:
+            placeholders = ', '.join('?' * len(missing))
+            rows = self._connection().execute(
+                f'SELECT key, value, expires FROM cache_entries '
+                f'WHERE key IN ({placeholders})', list(missing))
+            now = time.time()
+            for key, pickled, expires in rows:
+                if expires is not None and expires <= now:
+                    continue
+                self._remember(key, missing[key], pickled, expires)
+                found[keys[key]] = pickle.loads(pickled)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version),
+             pickle.dumps(value, self.pickle_protocol), expires)
+            for key, value in data.items()
+        ]
+        with self._transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires) '
+                'VALUES (?, ?, ?)', rows)
+            for key, pickled, expires in rows:
+                self._changed(key, pickled, expires)
+        self._maybe_cull(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        with self._transaction() as conn:
+            added = conn.execute(
+                'INSERT INTO cache_entries (key, value, expires) '
+                'VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE '
+                'SET value = excluded.value, expires = excluded.expires '
+                'WHERE cache_entries.expires <= ?',
+                (key, pickled, expires, time.time())).rowcount > 0
+            if added:
+                self._changed(key, pickled, expires)
+        if added:
+            self._maybe_cull(1)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        with self._transaction() as conn:
+            touched = conn.execute(
+                'UPDATE cache_entries SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (expires, key, time.time())).rowcount > 0
+            if touched:
+                self._changed(key)
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        original, key = key, self._key(key, version)
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or row[1] is not None and row[1] <= time.time():
+                raise ValueError(f"Key '{original}' not found")
+            value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            conn.execute('UPDATE cache_entries SET value = ? WHERE key = ?',
+                         (pickled, key))
+            self._changed(key, pickled, row[1])
+        return value
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._transaction() as conn:
+            conn.executemany('DELETE FROM cache_entries WHERE key = ?',
+                             [(key,) for key in keys])
+            for key in keys:
+                self._changed(key)
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM cache_entries')
+            self._changed(None)
+
+    def _maybe_cull(self, written):
+        """Trims the shared store every CULL_EVERY writes
+        of this process."""
+        self._writes += written
+        if self._writes < self._cull_every:
+            return
+        self._writes = 0
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM cache_entries WHERE expires <= ?',
+                         (time.time(),))
+            count = conn.execute(
+                'SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+            if count > self._max_entries and self._cull_frequency == 0:
+                conn.execute('DELETE FROM cache_entries')
+            elif count > self._max_entries:
+                conn.execute(
+                    'DELETE FROM cache_entries WHERE key IN ('
+                    'SELECT key FROM cache_entries '
+                    'ORDER BY expires IS NULL, expires LIMIT ?)',
+                    (count // self._cull_frequency,))
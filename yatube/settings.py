@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'about',
     'users',
     'posts',
+    'tasks',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -117,15 +118,106 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGINATE_BY = 10
 
+# Comments shown on a post page and loaded by each "show more".
+COMMENTS_PAGINATE_BY = 20
+
+# Search ranks only the newest matching posts, so that a query
+# for a common word costs the same however many posts contain it.
+SEARCH_MAX_RESULTS = 1000
+
+# Author and group suggestions: how many are returned at most, and
+# seconds after which a worker reloads its index to see the changes
+# made by other workers.
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_AGE = 60 * 5
+
+# Most posts or comments accepted by one request to the batch API.
+BATCH_MAX_ITEMS = 100
+
+# Paginators stop counting past this many objects and show
+# the total as approximate.
+PAGINATOR_COUNT_LIMIT = 1000
+
+# Seconds a cached feed size lives before it is recounted.
+PAGINATOR_COUNT_TIMEOUT = 60 * 60
+
+# How the follow feed is built: 'timeline' reads the fanned-out
+# timelines, 'merge' merges cached lists of recent posts of the
+# followed authors, 'query' filters all posts by followed authors.
+FOLLOW_FEED_ENGINE = 'timeline'
+
+# Length of the cached list of recent posts per author
+# used by the 'merge' follow feed engine.
+FOLLOW_FEED_CACHED_POSTS = 100
+
+# Seconds such a list lives, so that a list loaded while a post was
+# being published does not miss it for good.
+FOLLOW_FEED_CACHED_POSTS_TIMEOUT = 10 * 60
+
+# Seconds a rendered post card stays in the cache.
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Seconds a feed page rendered for anonymous users stays in the cache
+# if its feed has not changed.
+FEED_PAGE_TIMEOUT = 60 * 10
+
+# Background tasks: attempts before a task becomes a dead letter,
+# the first retry delay and its cap in seconds, how long a worker may
+# hold a task before others take it over, and the default pool size.
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_DELAY = 10
+TASKS_RETRY_MAX_DELAY = 60 * 60
+TASKS_LEASE = 60 * 5
+TASKS_WORKERS = 2
+
+# Followers above which a new post is copied to their timelines
+# by a background task instead of during the request.
+TIMELINE_INLINE_FAN_OUT = 100
+
+# Uploaded post images: larger ones are rejected, longer sides are
+# scaled down to POST_IMAGE_MAX_SIDE, lossy formats are re-encoded
+# at POST_IMAGE_QUALITY.
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_QUALITY = 85
+
+THUMBNAIL_ENGINE = 'posts.thumbnails.Engine'
+
+# The post card image: the size of its crop, the widths it is made in
+# for srcset, the formats made besides the default one, the sizes
+# attribute of the card and the size of its inline placeholder.
+POST_CARD_SIZE = (960, 339)
+POST_CARD_WIDTHS = (480, 960, 1440)
+POST_CARD_FORMATS = ('WEBP',)
+POST_CARD_SIZES = '(max-width: 767px) 100vw, 730px'
+POST_CARD_PLACEHOLDER_SIZE = (24, 8)
+
+# Collection of unused media: entries examined per batch and per
+# second, and seconds a file on disk is left alone after it was
+# written, since its post may not be saved yet.
+MEDIA_GC_BATCH_SIZE = 200
+MEDIA_GC_RATE = 100
+MEDIA_GC_GRACE = 60 * 60
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# An in-process LRU in front of a SQLite file shared by all workers
+# of the host; writes are propagated through version stamps.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.TwoTierCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'L1_MAX_ENTRIES': 2000,
+        },
     }
 }
 
+# Runs the tests against a temporary copy of the caches above.
+TEST_RUNNER = 'yatube.test_runner.TemporaryCacheRunner'
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
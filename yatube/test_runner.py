@@ -0,0 +1,33 @@
+"""Test runner that keeps the tests away from the site's cache."""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temporary_caches():
+    """Points the caches to a temporary directory, so that
+    cache.clear() in a test does not wipe the cache of the site."""
+    with tempfile.TemporaryDirectory() as directory:
+        with override_settings(CACHES={
+                alias: {**config, 'LOCATION': os.path.join(
+                    directory, f'{alias}.sqlite3')}
+                for alias, config in settings.CACHES.items()}):
+            yield
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    """Runs the tests against temporary caches."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches = temporary_caches()
+        self.caches.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)